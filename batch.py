@@ -0,0 +1,392 @@
+"""
+Batched version of the mnm2.Game engine.
+
+BatchGame holds B independent games as rows of numpy arrays (bank, income, mines, units, ...) and steps all of them with one vectorized call per action. The rules mirror Game exactly, and every row can have its own tables and balance constants, so the batch axis can stand for different games, maps or balance variants.
+
+batch = BatchGame(1024)
+while np.any(batch.round < Game.FINAL_ROUND):
+    batch.step(batch_random_policy(batch, rng))
+"""
+
+import numpy as np
+
+from mnm2 import Game
+
+
+# Decoded Game.action_space: action type and arguments for every action int.
+ACTION_TYPES = np.array([action[0] for action in Game.action_space])
+ACTION_ARG0 = np.array([action[1][0] if action[1] else 0 for action in Game.action_space])
+ACTION_ARG1 = np.array([action[1][1] if len(action[1]) > 1 else 0 for action in Game.action_space])
+NUM_ACTIONS = len(Game.action_space)
+
+# First action int of each action type.
+ACTION_OFFSETS = tuple(int(np.argmax(ACTION_TYPES == action_type)) for action_type in range(7))
+
+
+def _batched(table, batch_size, ndim, dtype):
+    """
+    Copies a table to shape (batch_size, ...), broadcasting it if it has no batch axis.
+    """
+    table = np.asarray(table, dtype=dtype)
+    if table.ndim == ndim:
+        table = np.broadcast_to(table, (batch_size,) + table.shape)
+    elif table.ndim != ndim+1 or table.shape[0] != batch_size:
+        raise ValueError(f"Expected a table with {ndim} dims or a batch of {batch_size}, got shape {table.shape}")
+    return table.copy()
+
+
+def _template(table, batch_size, ndim, dtype):
+    """
+    Like _batched, but a table without a batch axis is kept as one shared copy.
+    """
+    table = np.asarray(table, dtype=dtype)
+    return table.copy() if table.ndim == ndim else _batched(table, batch_size, ndim, dtype)
+
+
+class BatchGame:
+    """
+    B games stepped together. Row b of every state array is one Game.
+    Tables and balance constants can be shared (no batch axis) or given per row (leading batch axis).
+    """
+    # Starting tables rows are reset to. Shared tables are kept once, without a batch axis.
+    TEMPLATES = ('initial_mines', 'initial_mine_upgrades', 'initial_sends', 'initial_units')
+
+    def __init__(self, batch_size, mines=Game.mines, mine_upgrades=Game.mine_upgrades, sends=Game.sends, units=Game.units,
+                 mine_purchase_cost_vals=Game.MINE_PURCHASE_COST_VALS,
+                 gold_upgrade_costs_mana=Game.MINE_GOLD_UPGRADE_COSTS_MANA,
+                 gold_upgrade_costs_default=Game.MINE_GOLD_UPGRADE_COSTS_DEFAULT):
+        self.batch_size = batch_size
+        self.mine_purchase_cost_vals = _batched(mine_purchase_cost_vals, batch_size, 1, np.float32)
+        self.gold_upgrade_costs_mana = _batched(gold_upgrade_costs_mana, batch_size, 1, np.float32)
+        self.gold_upgrade_costs_default = _batched(gold_upgrade_costs_default, batch_size, 1, np.float32)
+
+        # The first gold upgrade cost goes into the upgrade table, so it is only shared if the upgrade costs are too.
+        shared_upgrades = np.ndim(mine_upgrades) == 2 and np.ndim(gold_upgrade_costs_mana) == 1 and np.ndim(gold_upgrade_costs_default) == 1
+        num_rows = 1 if shared_upgrades else batch_size
+        mine_upgrades = _batched(mine_upgrades, num_rows, 2, np.float64)
+        gold_rows = mine_upgrades[:, :, 3] == Game.GOLD
+        mana_mines = mine_upgrades[:, :, 1] == Game.MANA
+        mine_upgrades[:, :, 4] = np.where(gold_rows & mana_mines, self.gold_upgrade_costs_mana[:num_rows, :1], mine_upgrades[:, :, 4])
+        mine_upgrades[:, :, 4] = np.where(gold_rows & ~mana_mines, self.gold_upgrade_costs_default[:num_rows, :1], mine_upgrades[:, :, 4])
+
+        # Starting tables, kept so rows can be reset.
+        self.initial_mines = _template(mines, batch_size, 2, np.float32)
+        self.initial_mine_upgrades = mine_upgrades[0] if shared_upgrades else mine_upgrades
+        self.initial_sends = _template(sends, batch_size, 2, np.float32)
+        self.initial_units = _template(units, batch_size, 2, np.float32)
+        if self.initial_mines.shape[-2:] != Game.mines.shape or self.initial_sends.shape[-2:] != Game.sends.shape or self.initial_units.shape[-2:] != Game.units.shape:
+            raise ValueError("Tables must have the shapes Game.action_space was built for")
+
+        self.bank = np.empty((batch_size, 7), dtype=np.float32)
+        self.income = np.empty((batch_size, 7), dtype=np.float32)
+        self.round = np.empty(batch_size, dtype=np.int64)
+        self.const = np.empty(batch_size, dtype=np.int64)
+        self.const_cost = np.zeros((batch_size, 7), dtype=np.float32)
+        self.owned_mines = np.empty(batch_size, dtype=np.int64)
+        self.mine_purchase_cost = np.zeros((batch_size, 7), dtype=np.float32)
+        self.mines = _batched(self.initial_mines, batch_size, 2, np.float32)
+        self.mine_upgrades = _batched(self.initial_mine_upgrades, batch_size, 2, np.float64)
+        self.sends = _batched(self.initial_sends, batch_size, 2, np.float32)
+        self.units = _batched(self.initial_units, batch_size, 2, np.float32)
+        self.last_action = np.empty(batch_size, dtype=np.int64) # Action each row performed in the last step, -1 if none.
+        self.num_steps = 0
+        self.reset()
+
+    def __len__(self):
+        return self.batch_size
+
+    def reset(self, rows=None):
+        """
+        Puts the given rows (default: all) back to the start of a game.
+        """
+        rows = slice(None) if rows is None else rows
+        self.bank[rows] = (60, 0, 0, 0, 0, 0, 0)
+        self.income[rows] = (16, 0, 0, 0, 0, 0, 0)
+        self.round[rows] = 1
+        self.const[rows] = 1
+        self.const_cost[rows, 0] = 31
+        self.owned_mines[rows] = 0
+        self.mine_purchase_cost[rows, 0] = self.mine_purchase_cost_vals[rows, 0]
+        self.mines[rows] = self.template_rows(self.initial_mines, rows)
+        self.mine_upgrades[rows] = self.template_rows(self.initial_mine_upgrades, rows)
+        self.sends[rows] = self.template_rows(self.initial_sends, rows)
+        self.units[rows] = self.template_rows(self.initial_units, rows)
+        self.last_action[rows] = -1
+        self._legal_mask = None
+
+    @staticmethod
+    def template_rows(template, rows):
+        """
+        The given rows of a starting table, or the table itself if it is shared.
+        """
+        return template if template.ndim == 2 else template[rows]
+
+    def load_game(self, row, game):
+        """
+        Copies the state of an mnm2.Game into a row.
+        """
+        self.bank[row] = game.bank
+        self.income[row] = game.income
+        self.round[row] = game.round
+        self.const[row] = game.const
+        self.const_cost[row] = game.const_cost
+        self.owned_mines[row] = game.owned_mines
+        self.mine_purchase_cost[row] = game.mine_purchase_cost
+        self.mines[row] = game.mines
+        self.mine_upgrades[row] = game.mine_upgrades
+        self.sends[row] = game.sends
+        self.units[row] = game.units
+        self._legal_mask = None
+
+    def take(self, rows):
+        """
+        Returns a new BatchGame made of copies of the given rows (repeats allowed).
+        """
+        rows = np.asarray(rows)
+        batch = BatchGame.__new__(BatchGame)
+        for name, value in self.__dict__.items():
+            batch.__dict__[name] = value[rows] if isinstance(value, np.ndarray) and not self.is_shared(name) else value
+        batch.batch_size = len(rows)
+        return batch
+
+    def is_shared(self, name):
+        return name in BatchGame.TEMPLATES and self.__dict__[name].ndim == 2
+
+    @staticmethod
+    def concatenate(batches):
+        """
+        Returns a new BatchGame with the rows of all the given batches, in order.
+        """
+        batch = BatchGame.__new__(BatchGame)
+        for name, value in batches[0].__dict__.items():
+            if name in BatchGame.TEMPLATES:
+                templates = [other.__dict__[name] for other in batches]
+                if all(other.is_shared(name) and (template is value or np.array_equal(template, value)) for other, template in zip(batches, templates)):
+                    batch.__dict__[name] = value
+                else:
+                    batch.__dict__[name] = np.concatenate([np.broadcast_to(template, (other.batch_size,) + template.shape[-2:]) for other, template in zip(batches, templates)])
+            elif isinstance(value, np.ndarray) and name != '_legal_mask':
+                batch.__dict__[name] = np.concatenate([other.__dict__[name] for other in batches])
+            else:
+                batch.__dict__[name] = value
+        batch.batch_size = sum(other.batch_size for other in batches)
+        batch._legal_mask = None # Cached per batch, recomputed on demand.
+        return batch
+
+    # General
+    def get_score(self):
+        return np.sum(self.units[:, :, 0], axis=1) + 10*np.sum(self.units[:, :, 1], axis=1)
+
+    def get_state(self):
+        return np.concatenate((self.bank, self.income, self.round[:, None].astype(np.float32)), axis=1)
+
+    def affordable(self, costs, rows=None):
+        """
+        costs has shape (B, ..., 7), or (len(rows), ..., 7) for the given rows. Returns (B, ...) booleans.
+        """
+        bank = self.bank if rows is None else self.bank[rows]
+        bank = bank.reshape((len(bank),) + (1,)*(costs.ndim-2) + (7,))
+        return np.all(costs <= bank, axis=-1) # Same as bank - costs >= 0 without the temporary.
+
+    def legal_mask(self, rows=None):
+        """
+        Returns a (B, NUM_ACTIONS) boolean mask of the actions each row could take, same as Game.get_available_actions.
+        Cached until the next step, don't modify it in place.
+        Given rows, returns the (len(rows), NUM_ACTIONS) mask of just those rows, only gathering the table entries it needs. That one isn't cached.
+        """
+        if rows is None and self._legal_mask is not None:
+            return self._legal_mask
+        select = slice(None) if rows is None else np.asarray(rows)
+        num_rows = self.batch_size if rows is None else len(select)
+        mask = np.zeros((num_rows, NUM_ACTIONS), dtype=bool)
+        mask[:, ACTION_OFFSETS[0]] = True
+        mask[:, ACTION_OFFSETS[1]] = self.affordable(self.const_cost[select], rows)
+
+        # Units
+        units = self.units[select]
+        num_units = units.shape[1]
+        need_to_research = np.sum(units[:, :, :2], axis=2) == 0
+        costs = units[:, :, 9:16] + need_to_research[:, :, None]*units[:, :, 2:9]
+        mask[:, ACTION_OFFSETS[2]:ACTION_OFFSETS[2]+num_units] = self.affordable(costs, rows)
+        mask[:, ACTION_OFFSETS[3]:ACTION_OFFSETS[3]+num_units] = (units[:, :, 0] > 0) & self.affordable(units[:, :, 16:], rows)
+
+        # Sends
+        sends = self.sends[select]
+        num_sends = sends.shape[1]
+        mask[:, ACTION_OFFSETS[4]:ACTION_OFFSETS[4]+num_sends] = (sends[:, :, 0] <= self.round[select, None]) & self.affordable(sends[:, :, 2:], rows)
+
+        # Mines
+        mines = self.mines[select, :, :3]
+        num_mines = mines.shape[1]
+        food_mines = mines[:, :, 0] == Game.FOOD
+        costs = np.where(food_mines[:, :, None], Game.MINE_FOOD_PURCHASE_COST, self.mine_purchase_cost[select, None, :])
+        available = (mines[:, :, 2] == 0) & (mines[:, :, 1] <= self.const[select, None])
+        mask[:, ACTION_OFFSETS[5]:ACTION_OFFSETS[5]+num_mines] = available & self.affordable(costs, rows)
+
+        # Each mine upgrade only costs the resource it upgrades with, so only that entry of the cost is checked.
+        # Upgrades are stored mine-major but numbered resource-major in the action space, indexing gives (rows, resource, mine).
+        resources = np.arange(7)
+        row_ids = np.arange(self.batch_size) if rows is None else select
+        upgrades = self.mine_upgrades.reshape(self.batch_size, num_mines, 7, 11)
+        costs = upgrades[row_ids[:, None], :, resources, 4+resources]
+        bank = self.bank[select]
+        upgradable = (upgrades[row_ids[:, None], :, resources, 2] == 1) & (costs <= bank[:, :, None])
+        mask[:, ACTION_OFFSETS[6]:] = upgradable.reshape(num_rows, 7*num_mines)
+        if rows is None:
+            self._legal_mask = mask
+        return mask
+
+    def step(self, actions):
+        """
+        Performs one action int per row. Rows given -1 are left untouched. Assumes the actions are legal.
+        """
+        actions = np.asarray(actions)
+        self.last_action[:] = actions
+        self.num_steps += 1
+        self._legal_mask = None
+        action_types = np.where(actions >= 0, ACTION_TYPES[actions], -1)
+        arg0 = ACTION_ARG0[actions]
+        arg1 = ACTION_ARG1[actions]
+
+        # Next round
+        rows = np.nonzero(action_types == 0)[0]
+        self.bank[rows] += self.income[rows]
+        self.round[rows] += 1
+
+        # Construction yard
+        rows = np.nonzero(action_types == 1)[0]
+        self.bank[rows] -= self.const_cost[rows]
+        self.const_cost[rows, 0] += 10
+        self.const[rows] += 1
+
+        # Purchase unit
+        rows = np.nonzero(action_types == 2)[0]
+        unit_ids = arg0[rows]
+        cost = self.units[rows, unit_ids, 9:16]
+        need_to_research = np.sum(self.units[rows, unit_ids, :2], axis=1) == 0
+        cost += need_to_research[:, None]*self.units[rows, unit_ids, 2:9]
+        self.bank[rows] -= cost
+        self.units[rows, unit_ids, 0] += 1
+
+        # Upgrade unit
+        rows = np.nonzero(action_types == 3)[0]
+        unit_ids = arg0[rows]
+        self.bank[rows] -= self.units[rows, unit_ids, 16:]
+        self.units[rows, unit_ids, 0] -= 1
+        self.units[rows, unit_ids, 1] += 1
+
+        # Send
+        rows = np.nonzero(action_types == 4)[0]
+        send_ids = arg0[rows]
+        self.bank[rows] -= self.sends[rows, send_ids, 2:]
+        self.income[rows, 0] += self.sends[rows, send_ids, 1]
+
+        # Purchase mine
+        rows = np.nonzero(action_types == 5)[0]
+        mine_ids = arg0[rows]
+        self.mines[rows, mine_ids, 2] = 1
+        food_mines = self.mines[rows, mine_ids, 0] == Game.FOOD
+        self.bank[rows[food_mines], 0] -= Game.MINE_FOOD_PURCHASE_COST[0]
+        other_rows = rows[~food_mines]
+        self.bank[other_rows, 0] -= self.mine_purchase_cost[other_rows, 0]
+        self.owned_mines[other_rows] += 1
+        next_cost = self.mine_purchase_cost_vals[other_rows, np.minimum(self.owned_mines[other_rows], 6)]
+        self.mine_purchase_cost[other_rows, 0] = np.where(self.owned_mines[other_rows] <= 6, next_cost, self.mine_purchase_cost[other_rows, 0])
+        self.income[rows] += self.mines[rows, mine_ids, 10:]
+        self.mine_upgrades[rows[:, None], 7*mine_ids[:, None] + np.arange(7), 2] = 1
+
+        # Upgrade mine
+        rows = np.nonzero(action_types == 6)[0]
+        mine_ids, res_ids = arg0[rows], arg1[rows]
+        upgrade_ids = 7*mine_ids + res_ids
+        mine_types = self.mines[rows, mine_ids, 0].astype(np.int64)
+        old_income = self.mines[rows, mine_ids, 10:].copy()
+        self.mines[rows, mine_ids, 3+res_ids] += 1
+        upgrade_vals = self.mines[rows, mine_ids, 3+res_ids].astype(np.int64)
+        self.bank[rows] -= self.mine_upgrades[rows, upgrade_ids, 4:11]
+
+        mana_mines = mine_types == Game.MANA
+        num_mana_costs = self.gold_upgrade_costs_mana.shape[1]
+        num_default_costs = self.gold_upgrade_costs_default.shape[1]
+        sold_out = (res_ids > 0) | (upgrade_vals >= np.where(mana_mines, num_mana_costs, num_default_costs))
+        self.mine_upgrades[rows[sold_out], upgrade_ids[sold_out], 2] = 0
+        gold = ~sold_out
+        next_cost = np.where(mana_mines[gold],
+                             self.gold_upgrade_costs_mana[rows[gold], np.minimum(upgrade_vals[gold], num_mana_costs-1)],
+                             self.gold_upgrade_costs_default[rows[gold], np.minimum(upgrade_vals[gold], num_default_costs-1)])
+        self.mine_upgrades[rows[gold], upgrade_ids[gold], 4] = next_cost
+
+        upgrades = self.mines[rows, mine_ids, 3:10]
+        new_income = np.round((Game.MINE_BASE_INCOMES[mine_types, mine_types] + upgrades[:, 0]) * (1 + 0.2*np.sum(upgrades[:, 1:], axis=1)), 1)
+        self.mines[rows, mine_ids, 10+mine_types] = new_income
+        self.income[rows] += self.mines[rows, mine_ids, 10:] - old_income
+
+    def done(self):
+        return self.round >= Game.FINAL_ROUND
+
+
+_single_row = None # One row batch reused by single_row.
+
+
+def single_row(game):
+    """
+    Returns a one row BatchGame holding the state of an mnm2.Game, to run batched code on a single game.
+    The same batch is reused by every call, so use it before the next one.
+    """
+    global _single_row
+    if _single_row is None:
+        _single_row = BatchGame(1)
+    _single_row.load_game(0, game)
+    return _single_row
+
+
+### Batched policies: policy(batch, rng) returns one action int per row.
+def batch_random_policy(batch, rng):
+    """
+    Picks uniformly among each row's legal actions.
+    """
+    keys = rng.random((batch.batch_size, NUM_ACTIONS))
+    return np.argmax(np.where(batch.legal_mask(), keys, -1), axis=1)
+
+
+class BatchSchedulePolicy:
+    """
+    Batched simulate.SchedulePolicy. Every row replays the same schedule of action ints, moving to the next round until its next scheduled action is legal.
+    A row only moves along the schedule once the scheduled action was actually performed, so rows can be held back or overridden by the caller.
+    """
+    def __init__(self, schedule, batch_size):
+        self.schedule = np.asarray(tuple(schedule) + (0,), dtype=np.int64) # Trailing 0 keeps finished rows moving to the next round.
+        self.position = np.zeros(batch_size, dtype=np.int64)
+        self.scheduled = np.full(batch_size, -1, dtype=np.int64) # Scheduled action handed out on the last call, -1 if none.
+        self.num_steps = None # batch.num_steps on the last call.
+
+    def sync(self, batch):
+        """
+        Moves rows past the scheduled action they were handed out if the step since the last call performed it.
+        """
+        if self.num_steps is not None and batch.num_steps == self.num_steps + 1:
+            self.position += (self.scheduled >= 0) & (batch.last_action == self.scheduled)
+        self.scheduled[:] = -1
+        self.num_steps = batch.num_steps
+
+    def __call__(self, batch, rng):
+        self.sync(batch)
+        rows = np.arange(batch.batch_size)
+        position = np.minimum(self.position, len(self.schedule)-1)
+        actions = self.schedule[position]
+        legal = batch.legal_mask()[rows, actions] & (self.position < len(self.schedule)-1)
+        self.scheduled = np.where(legal, actions, -1)
+        return np.where(legal, actions, 0)
+
+
+def play_batch(batch, policy, rng=None):
+    """
+    Plays every row to the end of the game. Rows that finish early are left untouched.
+    """
+    rng = np.random.default_rng(rng)
+    while True:
+        finished = batch.done()
+        if np.all(finished):
+            return batch
+        actions = np.asarray(policy(batch, rng))
+        batch.step(np.where(finished, -1, actions))
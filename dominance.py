@@ -0,0 +1,208 @@
+"""
+Static dominance analysis of the action tables.
+
+An action is dominated when some other choice is provably at least as good in every continuation: after taking the alternative instead, the bank is at least as large in every resource at every later point, so every later plan stays affordable and ends with at least the same score. Dominated actions can be pruned from search and RL without losing optimality. The analysis looks at:
+- sends: another send (or k copies of it) unlocked by the same round that costs no more of any resource and gives at least as much income;
+- self-financed mine upgrades (gold upgrades on gold mines, a mine's rare upgrade with its own resource): not taking them is better if they can't return their cost before the game ends, even counting the rare/gold upgrades they could still combine with;
+- rare upgrades on gold mines: a send (or k copies) that costs no more and gives at least the most gold the upgrade could ever add;
+- units: another unit that is no more expensive to buy now, to buy later and to upgrade.
+
+The results are precomputed per round and mine state class (mine type, gold upgrades, rare upgrades) and per research state, and dominance_mask() turns them into a (B, NUM_ACTIONS) mask to AND with BatchGame.legal_mask(). They only hold for the default send, unit and upgrade costs, so dominance_mask() raises on rows with other ones, e.g. from sweep.py. Maps may differ.
+
+python dominance.py # Print what is dominated and when.
+"""
+
+import sys
+
+import numpy as np
+
+from batch import ACTION_OFFSETS, BatchGame, NUM_ACTIONS, single_row
+from mnm2 import Game
+from roi import MAX_GOLD_UPGRADES, MAX_RARE_UPGRADES, UPGRADE_GAIN
+
+
+MAX_COPIES = 4 # Largest number of copies of a send tried as a replacement.
+ROUNDS = np.arange(Game.FINAL_ROUND + 1)
+
+
+def _copies_dominate(costs, incomes, cost, income):
+    """
+    For every (send, copies): do `copies` copies of the send cost no more than cost in every resource and give at least income?
+    Shapes: costs (S, 7), incomes (S,), cost (..., 7), income (...). Returns (..., S, MAX_COPIES).
+    """
+    copies = np.arange(1, MAX_COPIES + 1)
+    cheap_enough = np.all(costs[:, None, :]*copies[:, None] <= cost[..., None, None, :], axis=-1)
+    return cheap_enough & (incomes[:, None]*copies >= income[..., None, None])
+
+
+def send_dominance(sends=Game.sends):
+    """
+    SEND_DOMINATED[round, send]. Identical sends keep the lowest index.
+    """
+    num_sends = len(sends)
+    costs, incomes, unlocks = sends[:, 2:], sends[:, 1], sends[:, 0]
+    beats = _copies_dominate(costs, incomes, costs, incomes) # [j, i, copies]: copies of i replace j.
+    strictly = np.any(costs[None, :, None, :]*np.arange(1, MAX_COPIES + 1)[:, None] < costs[:, None, None, :], axis=-1) | \
+        (incomes[None, :, None]*np.arange(1, MAX_COPIES + 1) > incomes[:, None, None])
+    index = np.arange(num_sends)
+    tie_break = (index[None, :] < index[:, None])[:, :, None]
+    beats &= (strictly | tie_break) & (index[None, :, None] != index[:, None, None])
+    beats = np.any(beats, axis=2) # [j, i]
+    unlocked = unlocks[None, :] <= ROUNDS[:, None] # [round, i]
+    return np.any(beats[None, :, :] & unlocked[:, None, :], axis=2)
+
+
+def _gold_caps():
+    return np.array([len(Game.MINE_GOLD_UPGRADE_COSTS_MANA) if mine_type == Game.MANA else len(Game.MINE_GOLD_UPGRADE_COSTS_DEFAULT) for mine_type in range(7)])
+
+
+def upgrade_dominance(sends=Game.sends):
+    """
+    UPGRADE_DOMINATED[round, mine type, gold upgrades, rare upgrades, upgrade resource].
+    """
+    gold_caps = _gold_caps()
+    gold = np.arange(MAX_GOLD_UPGRADES + 1)
+    rare = np.arange(MAX_RARE_UPGRADES + 1)
+    reachable = gold[None, :] <= gold_caps[:, None] # [type, gold]
+
+    # Most an upgrade can ever add per round: the gain once every other upgrade it combines with is done.
+    gains = np.where(reachable[:, :, None, None], UPGRADE_GAIN, 0)
+    gold_bound = np.maximum.accumulate(gains[:, :, ::-1, 0], axis=2)[:, :, ::-1] # Over rare upgrades still to come.
+    rare_bound = np.maximum.accumulate(gains[:, ::-1, :, 1:], axis=1)[:, ::-1] # Over gold upgrades still to come.
+    bound = np.concatenate((gold_bound[..., None], rare_bound), axis=3) # [type, gold, rare, resource]
+
+    # Upgrade costs with the default constants.
+    costs = np.zeros(bound.shape + (7,))
+    for mine_type in range(7):
+        gold_costs = Game.MINE_GOLD_UPGRADE_COSTS_MANA if mine_type == Game.MANA else Game.MINE_GOLD_UPGRADE_COSTS_DEFAULT
+        costs[mine_type, :len(gold_costs), :, 0, 0] = np.array(gold_costs)[:, None]
+    for resource in range(1, 7):
+        costs[:, :, :, resource, resource] = Game.MINE_RARE_UPCGRADE_COSTS[resource]
+    own_cost = costs[np.arange(7)[:, None, None, None], gold[None, :, None, None], rare[None, None, :, None], np.arange(7), np.arange(7)[:, None, None, None]]
+
+    # Self financed upgrades that can't pay back in the rounds left.
+    self_financed = (np.arange(7)[:, None, None, None] == np.arange(7)) & (own_cost > 0)
+    rounds_left = Game.FINAL_ROUND - ROUNDS
+    dominated = self_financed & (bound*rounds_left[:, None, None, None, None] <= own_cost)
+
+    # Rare upgrades on gold mines against sends.
+    unlocked = sends[:, 0][None, :] <= ROUNDS[:, None] # [round, send]
+    by_send = np.any(_copies_dominate(sends[:, 2:], sends[:, 1], costs[Game.GOLD], bound[Game.GOLD]), axis=-1) # [gold, rare, resource, send]
+    by_send[..., 0, :] = False # Gold upgrades cost gold, which sends never replace.
+    dominated[:, Game.GOLD] |= np.any(by_send[None] & unlocked[:, None, None, None, :], axis=-1)
+    return dominated & (gold[None, None, :, None, None] <= gold_caps[None, :, None, None, None])
+
+
+def unit_dominance(units=Game.units):
+    """
+    UNIT_DOMINATED[research state, unit] for unit purchases. Bit u of the research state is set once unit u is researched.
+    """
+    num_units = len(units)
+    states = np.arange(2**num_units)
+    researched = (states[:, None] >> np.arange(num_units)) & 1 == 1 # [state, unit]
+    buy, research, upgrade = units[:, 9:16], units[:, 2:9], units[:, 16:]
+    now = buy[None] + (~researched)[:, :, None]*research[None] # [state, unit, 7]
+
+    no_worse = np.all(now[:, None, :, :] <= now[:, :, None, :], axis=-1) # [state, j, i]: i is no worse now than j
+    no_worse &= np.all(buy[None, :, :] <= buy[:, None, :], axis=-1) & np.all(upgrade[None, :, :] <= upgrade[:, None, :], axis=-1)
+    strictly = np.any(now[:, None, :, :] < now[:, :, None, :], axis=-1) | \
+        np.any(buy[None, :, :] < buy[:, None, :], axis=-1) | np.any(upgrade[None, :, :] < upgrade[:, None, :], axis=-1)
+    index = np.arange(num_units)
+    beats = no_worse & (strictly | (index[None, :] < index[:, None])) & (index[None, :] != index[:, None])
+    return np.any(beats, axis=2)
+
+
+SEND_DOMINATED = send_dominance()
+UPGRADE_DOMINATED = upgrade_dominance()
+UNIT_DOMINATED = unit_dominance()
+
+
+def _matches(values, default):
+    default = np.asarray(default, dtype=values.dtype)
+    return values.shape[values.ndim-default.ndim:] == default.shape and bool(np.all(values == default))
+
+
+RARE_UPGRADE_COSTS = np.array(Game.MINE_RARE_UPCGRADE_COSTS)
+
+
+def uses_default_costs(batch):
+    """
+    Whether every row has the send, unit and mine upgrade costs the dominance tables were built for.
+    """
+    resources = batch.mine_upgrades[:, :, 3].astype(np.int64)
+    rare_costs = np.take_along_axis(batch.mine_upgrades[:, :, 4:], resources[:, :, None], axis=2)[:, :, 0]
+    return (_matches(batch.sends, Game.sends) and _matches(batch.units[:, :, 2:], Game.units[:, 2:])
+            and _matches(batch.gold_upgrade_costs_mana, Game.MINE_GOLD_UPGRADE_COSTS_MANA)
+            and _matches(batch.gold_upgrade_costs_default, Game.MINE_GOLD_UPGRADE_COSTS_DEFAULT)
+            and bool(np.all((resources == Game.GOLD) | (rare_costs == RARE_UPGRADE_COSTS[resources]))))
+
+
+def dominance_mask(batch):
+    """
+    Returns a (B, NUM_ACTIONS) mask that is False for dominated actions. AND it with batch.legal_mask().
+    The tables are built for the default balance constants: raises ValueError if a row has other send, unit or upgrade costs.
+    """
+    if not uses_default_costs(batch):
+        raise ValueError("dominance_mask only holds for the default send, unit and upgrade costs")
+    batch_size, num_mines = batch.mines.shape[:2]
+    rounds = np.minimum(batch.round, Game.FINAL_ROUND)
+    mask = np.ones((batch_size, NUM_ACTIONS), dtype=bool)
+
+    num_units = batch.units.shape[1]
+    research_states = (np.sum(batch.units[:, :, :2], axis=2) > 0) @ (1 << np.arange(num_units))
+    mask[:, ACTION_OFFSETS[2]:ACTION_OFFSETS[2]+num_units] = ~UNIT_DOMINATED[research_states]
+
+    num_sends = batch.sends.shape[1]
+    mask[:, ACTION_OFFSETS[4]:ACTION_OFFSETS[4]+num_sends] = ~SEND_DOMINATED[rounds]
+
+    mine_types = batch.mines[:, :, 0].astype(np.int64)
+    gold = np.minimum(batch.mines[:, :, 3].astype(np.int64), MAX_GOLD_UPGRADES)
+    rare = np.minimum(np.sum(batch.mines[:, :, 4:10], axis=2).astype(np.int64), MAX_RARE_UPGRADES)
+    dominated = UPGRADE_DOMINATED[rounds[:, None], mine_types, gold, rare] # (B, mines, resource)
+    mask[:, ACTION_OFFSETS[6]:] = ~dominated.transpose(0, 2, 1).reshape(batch_size, -1)
+    return mask
+
+
+def game_dominance_mask(game):
+    """
+    dominance_mask for a single mnm2.Game, shape (NUM_ACTIONS,).
+    """
+    return dominance_mask(single_row(game))[0]
+
+
+def report():
+    lines = []
+    for send_id, name in enumerate(Game.SEND_NAMES):
+        rounds = np.nonzero(SEND_DOMINATED[:, send_id])[0]
+        if rounds.size:
+            lines.append(f"Send {name} dominated from round {rounds[0]}")
+    for mine_type, mine_name in enumerate(Game.RESOURCE_NAMES):
+        for resource, resource_name in enumerate(Game.RESOURCE_NAMES):
+            rounds = np.nonzero(UPGRADE_DOMINATED[:, mine_type, 0, 0, resource])[0]
+            if rounds.size:
+                lines.append(f"{resource_name} upgrade of a fresh {mine_name} mine dominated from round {rounds[0]}")
+    for research_state, dominated in enumerate(UNIT_DOMINATED):
+        for unit_id in np.nonzero(dominated)[0]:
+            lines.append(f"Unit {Game.UNIT_NAMES[unit_id]} dominated in research state {research_state:0{len(Game.UNIT_NAMES)}b}")
+    lines.append(f"{SEND_DOMINATED.sum()} (round, send), {UPGRADE_DOMINATED.sum()} (round, mine state, upgrade) and {UNIT_DOMINATED.sum()} (research state, unit) pairs dominated")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    print(report())
+    batch = BatchGame(256)
+    rng = np.random.default_rng(0)
+    legal = pruned = 0
+    while not np.all(batch.done()):
+        mask = batch.legal_mask()
+        keep = mask & dominance_mask(batch)
+        legal += mask.sum()
+        pruned += (mask & ~keep).sum()
+        keys = np.where(keep, rng.random(mask.shape), -1)
+        batch.step(np.where(batch.done(), -1, np.argmax(keys, axis=1)))
+    print(f"Random playouts: {pruned} of {legal} legal actions pruned ({100*pruned / legal:.1f}%)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
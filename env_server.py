@@ -0,0 +1,336 @@
+"""
+Local environment server for trainers running in another process or container on the same host.
+
+The server hosts `capacity` games as rows of one BatchGame and serves batched reset / step / mask requests over a Unix domain socket with a compact binary protocol (no JSON per step). Clients are multiplexed with asyncio, and step requests that are waiting at the same time are merged into a single BatchGame.step call. Clients address games by id and should use disjoint ids.
+
+Every message is a header followed by raw little-endian arrays:
+request:  op u8, count u32 | ids u32[count] | actions i16[count] (step only)
+response: status u8, count u32 | payload
+  info:  capacity u32, state size u32, number of actions u32
+  reset / step: states f32[count, STATE_SIZE] | rewards f32[count] | done u8[count]
+  mask:  packed legal action bits u8[count, MASK_BYTES] (np.packbits along the action axis)
+  error (status 1): message utf-8 bytes[count]
+States are Game.get_state (bank, income, round) and rewards are the change in get_score.
+
+python env_server.py serve --socket /tmp/mnm.sock --capacity 4096
+python env_server.py bench --capacity 4096 # Latency and steps/sec for batch sizes 1 to 4096.
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import stat
+import struct
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from batch import BatchGame, NUM_ACTIONS
+
+
+OP_INFO, OP_RESET, OP_STEP, OP_MASK = range(4)
+STATUS_OK, STATUS_ERROR = range(2)
+HEADER = struct.Struct('<BI')
+INFO = struct.Struct('<III')
+STATE_SIZE = 15
+MASK_BYTES = (NUM_ACTIONS + 7) // 8
+
+
+class EnvServer:
+    """
+    Serves a BatchGame of capacity rows on a Unix socket.
+    """
+    def __init__(self, path, capacity=4096):
+        self.path = path
+        self.capacity = capacity
+        self.games = BatchGame(capacity)
+        self.requests = None # asyncio.Queue of (op, ids, actions, future), made on the server's loop.
+        self.mask_cache = None # (games.num_steps, ids bytes, mask) of the last mask computed, reused by the usual mask-then-step pattern.
+
+    async def serve(self, ready=None):
+        self.requests = asyncio.Queue()
+        if os.path.exists(self.path) and stat.S_ISSOCK(os.stat(self.path).st_mode): # Only replace a stale socket, never some other file.
+            os.unlink(self.path)
+        server = await asyncio.start_unix_server(self.handle_client, path=self.path)
+        worker = asyncio.create_task(self.process_requests())
+        if ready is not None:
+            ready.set()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            worker.cancel()
+
+    async def handle_client(self, reader, writer):
+        try:
+            while True:
+                op, count = HEADER.unpack(await reader.readexactly(HEADER.size))
+                ids = actions = None
+                if op in (OP_RESET, OP_STEP, OP_MASK):
+                    ids = np.frombuffer(await reader.readexactly(4*count), dtype='<u4').astype(np.int64)
+                if op == OP_STEP:
+                    actions = np.frombuffer(await reader.readexactly(2*count), dtype='<i2').astype(np.int64)
+                future = asyncio.get_running_loop().create_future()
+                await self.requests.put((op, ids, actions, future))
+                writer.write(await future)
+                await writer.drain()
+        except asyncio.IncompleteReadError:
+            pass # Client disconnected.
+        finally:
+            writer.close()
+
+    async def process_requests(self):
+        """
+        Answers queued requests in order. Step requests queued back to back on disjoint ids are performed as one BatchGame.step.
+        """
+        while True:
+            pending = [await self.requests.get()]
+            while not self.requests.empty():
+                pending.append(self.requests.get_nowait())
+            steps = []
+            for request in pending:
+                op, ids, actions, future = request
+                if op == OP_STEP and not self.overlaps(steps, ids):
+                    steps.append(request)
+                    continue
+                self.flush_steps(steps)
+                if op == OP_STEP:
+                    steps = [request]
+                    continue
+                try:
+                    future.set_result(self.answer(op, ids))
+                except Exception as error: # Never let one request stop the worker every client waits on.
+                    future.set_result(error_message(f"Internal error: {error!r}"))
+            self.flush_steps(steps)
+
+    @staticmethod
+    def overlaps(steps, ids):
+        return any(np.intersect1d(step_ids, ids).size for _, step_ids, _, _ in steps)
+
+    def check_ids(self, ids):
+        if ids.size and (ids.min() < 0 or ids.max() >= self.capacity):
+            return f"Game ids must be below {self.capacity}"
+        if np.unique(ids).size != ids.size:
+            return "Game ids in a request must be distinct"
+        return None
+
+    def legal_mask(self, ids):
+        """
+        Legal actions of just the requested games, so the cost scales with the request and not the capacity.
+        """
+        if self.mask_cache is not None and self.mask_cache[0] == self.games.num_steps and self.mask_cache[1] == ids.tobytes():
+            return self.mask_cache[2]
+        mask = self.games.legal_mask(ids)
+        self.mask_cache = (self.games.num_steps, ids.tobytes(), mask)
+        return mask
+
+    def answer(self, op, ids):
+        if op == OP_INFO:
+            return HEADER.pack(STATUS_OK, 0) + INFO.pack(self.capacity, STATE_SIZE, NUM_ACTIONS)
+        error = self.check_ids(ids) if ids is not None else f"Unknown op {op}"
+        if error:
+            return error_message(error)
+        if not ids.size:
+            return HEADER.pack(STATUS_OK, 0)
+        if op == OP_RESET:
+            self.games.reset(ids)
+            self.mask_cache = None
+            return self.states_message(ids, np.zeros(len(ids), dtype=np.float32))
+        if op == OP_MASK:
+            return HEADER.pack(STATUS_OK, len(ids)) + np.packbits(self.legal_mask(ids), axis=1).tobytes()
+        return error_message(f"Unknown op {op}")
+
+    def flush_steps(self, steps):
+        """
+        Performs a group of step requests with one BatchGame.step and answers each of them. Empties steps.
+        """
+        group = list(steps)
+        steps.clear()
+        try:
+            self.perform_steps(group)
+        except Exception as error: # Never let one request stop the worker every client waits on.
+            for _, _, _, future in group:
+                if not future.done():
+                    future.set_result(error_message(f"Internal error: {error!r}"))
+
+    def perform_steps(self, steps):
+        valid = []
+        for op, ids, actions, future in steps:
+            if not ids.size:
+                future.set_result(HEADER.pack(STATUS_OK, 0))
+                continue
+            error = self.check_ids(ids)
+            if error is None and actions.size and (actions.min() < 0 or actions.max() >= NUM_ACTIONS):
+                error = f"Actions must be below {NUM_ACTIONS}"
+            if error is None and not np.all(self.games.done()[ids] | self.legal_mask(ids)[np.arange(len(ids)), actions]):
+                error = "Illegal action requested"
+            if error:
+                future.set_result(error_message(error))
+            else:
+                valid.append((ids, actions, future))
+        if not valid:
+            return
+
+        all_actions = np.full(self.capacity, -1, dtype=np.int64)
+        for ids, actions, future in valid:
+            all_actions[ids] = np.where(self.games.done()[ids], -1, actions) # Finished games stay put until reset.
+        score = self.games.get_score()
+        self.games.step(all_actions)
+        rewards = (self.games.get_score() - score).astype(np.float32)
+        for ids, actions, future in valid:
+            future.set_result(self.states_message(ids, rewards[ids]))
+
+    def states_message(self, ids, rewards):
+        states = self.games.get_state()[ids].astype('<f4')
+        done = self.games.done()[ids].astype(np.uint8)
+        return HEADER.pack(STATUS_OK, len(ids)) + states.tobytes() + rewards.astype('<f4').tobytes() + done.tobytes()
+
+
+def error_message(message):
+    message = message.encode()
+    return HEADER.pack(STATUS_ERROR, len(message)) + message
+
+
+class EnvError(Exception):
+    pass
+
+
+class EnvClient:
+    """
+    Blocking client for EnvServer.
+    """
+    def __init__(self, path):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(path)
+        self.capacity, self.state_size, self.num_actions = self.info()
+
+    def close(self):
+        self.socket.close()
+
+    def _receive(self, size):
+        data = bytearray(size)
+        view = memoryview(data)
+        while size:
+            received = self.socket.recv_into(view, size)
+            if not received:
+                raise EnvError("Server closed the connection")
+            view = view[received:]
+            size -= received
+        return data
+
+    def _request(self, op, ids=(), actions=None):
+        ids = np.ascontiguousarray(ids, dtype='<u4')
+        message = HEADER.pack(op, len(ids)) + ids.tobytes()
+        if actions is not None:
+            message += np.ascontiguousarray(actions, dtype='<i2').tobytes()
+        self.socket.sendall(message)
+        status, count = HEADER.unpack(self._receive(HEADER.size))
+        if status != STATUS_OK:
+            raise EnvError(self._receive(count).decode())
+        return count
+
+    def info(self):
+        self._request(OP_INFO)
+        return INFO.unpack(self._receive(INFO.size))
+
+    def _states(self, count):
+        data = self._receive(count*(4*STATE_SIZE + 5))
+        states = np.frombuffer(data, dtype='<f4', count=count*STATE_SIZE).reshape(count, STATE_SIZE)
+        rewards = np.frombuffer(data, dtype='<f4', count=count, offset=4*STATE_SIZE*count)
+        done = np.frombuffer(data, dtype=np.uint8, count=count, offset=4*(STATE_SIZE+1)*count).astype(bool)
+        return states, rewards, done
+
+    def reset(self, ids):
+        """
+        Restarts the given games. Returns (states, rewards, done).
+        """
+        return self._states(self._request(OP_RESET, ids))
+
+    def step(self, ids, actions):
+        """
+        Performs one legal action in each given game. Returns (states, rewards, done).
+        """
+        return self._states(self._request(OP_STEP, ids, actions))
+
+    def mask(self, ids):
+        """
+        Returns the (len(ids), num_actions) legal action mask.
+        """
+        count = self._request(OP_MASK, ids)
+        packed = np.frombuffer(self._receive(count*MASK_BYTES), dtype=np.uint8).reshape(count, MASK_BYTES)
+        return np.unpackbits(packed, axis=1, count=self.num_actions).astype(bool)
+
+
+### Benchmark
+def start_background_server(path, capacity):
+    """
+    Runs an EnvServer on a daemon thread and returns once it accepts connections.
+    """
+    ready = threading.Event()
+    server = EnvServer(path, capacity)
+    thread = threading.Thread(target=lambda: asyncio.run(server.serve(ready)), daemon=True)
+    thread.start()
+    ready.wait()
+    return server
+
+
+def benchmark(path, batch_sizes, seconds=1.0, seed=0, out=sys.stdout):
+    """
+    Steps random legal actions through a running server for each batch size and prints round trip latency and steps/sec.
+    Each round trip is a mask request plus a step request; games that finish are reset.
+    """
+    client = EnvClient(path)
+    rng = np.random.default_rng(seed)
+    print(f"{'batch':>6} {'step p50 ms':>12} {'step p99 ms':>12} {'round trips/s':>14} {'steps/s':>10}", file=out)
+    for batch_size in batch_sizes:
+        ids = np.arange(min(batch_size, client.capacity))
+        client.reset(ids)
+        latencies = []
+        start = time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            mask = client.mask(ids)
+            actions = np.argmax(np.where(mask, rng.random(mask.shape), -1), axis=1)
+            sent = time.perf_counter()
+            states, rewards, done = client.step(ids, actions)
+            latencies.append(time.perf_counter() - sent)
+            if np.any(done):
+                client.reset(ids[done])
+        elapsed = time.perf_counter() - start
+        latencies = np.array(latencies) * 1000
+        print(f"{len(ids):>6} {np.percentile(latencies, 50):>12.3f} {np.percentile(latencies, 99):>12.3f} "
+              f"{len(latencies) / elapsed:>14.1f} {len(latencies)*len(ids) / elapsed:>10.0f}", file=out, flush=True)
+    client.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve batched Mines and Magic games over a Unix socket.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    serve = subparsers.add_parser('serve')
+    serve.add_argument('--socket', default=os.path.join(tempfile.gettempdir(), 'mnm.sock'))
+    serve.add_argument('--capacity', type=int, default=4096)
+    bench = subparsers.add_parser('bench')
+    bench.add_argument('--socket', help='Benchmark an already running server instead of starting one.')
+    bench.add_argument('--capacity', type=int, default=4096)
+    bench.add_argument('--seconds', type=float, default=1.0, help='Time spent on each batch size.')
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        print(f"Serving {args.capacity} games on {args.socket}")
+        asyncio.run(EnvServer(args.socket, args.capacity).serve())
+        return 0
+
+    path = args.socket
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(), 'mnm.sock')
+        start_background_server(path, args.capacity)
+    batch_sizes = [2**power for power in range(13) if 2**power <= args.capacity]
+    benchmark(path, batch_sizes, args.seconds)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
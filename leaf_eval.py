@@ -0,0 +1,287 @@
+"""
+Learned leaf evaluator: predicts the final get_score of a game from its current state, in place of a rollout to round 38.
+
+Features are Game.get_state (bank, income, round) plus the income still to come, construction yards, owned mines / gold upgrades / rare upgrades per mine type, units and research, how many of each unit the resources at the end of the game would buy, and the score so far, extracted for a whole BatchGame at once. Models are a ridge regression or a small numpy MLP, fit offline on states from simulated games labelled with the score the game ended with. The games mix random actions into roi_policy for a random number of opening steps, and states are recorded once the game plays roi_policy alone, so the label is the value a roi_policy rollout from the state returns and the model stands in for that rollout. Both are stored as the same stack of dense layers in a small .npz file, and LeafModel.evaluate scores every row of a BatchGame in one vectorized call.
+
+The fit is weak. On held out games the MLP reaches an R^2 of about 0.35 and the ridge model about 0.2 (MAE 4.7 and 5.4 points, against 5.6 for always predicting the mean score), while the rollout it replaces is exact by construction. A model is about a thousand times cheaper per leaf than a rollout, but it only ranks states coarsely; report prints both baselines next to the models.
+
+python leaf_eval.py fit --model mlp --games 4096 --out leaf_mlp.npz
+python leaf_eval.py report leaf_ridge.npz leaf_mlp.npz # Accuracy and speed against the true final scores and against roi rollouts.
+python pareto_dp.py --leaf-model leaf_mlp.npz
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from batch import BatchGame, batch_random_policy, play_batch, single_row
+from mnm2 import Game
+from roi import roi_policy
+
+
+### Features
+def leaf_features(batch):
+    """
+    Feature matrix of every row of a BatchGame, shape (B, NUM_FEATURES), float32.
+    """
+    rounds_left = (Game.FINAL_ROUND - batch.round)[:, None]
+    owned = batch.mines[:, :, 2] > 0
+    mine_types = np.eye(7, dtype=np.float32)[batch.mines[:, :, 0].astype(np.int64)] * owned[:, :, None] # (B, mines, 7) one hot of owned mines
+    gold = np.sum(batch.mines[:, :, 3, None]*mine_types, axis=1)
+    rare = np.sum(np.sum(batch.mines[:, :, 4:10], axis=2)[:, :, None]*mine_types, axis=1)
+    researched = np.sum(batch.units[:, :, :2], axis=2) > 0
+    # How many times the resources at the end of the game cover buying and upgrading each unit, limited by the scarcest resource.
+    full_costs = batch.units[:, :, 9:16] + batch.units[:, :, 16:] + (~researched)[:, :, None]*batch.units[:, :, 2:9]
+    final_bank = batch.bank + batch.income*rounds_left
+    with np.errstate(divide='ignore', invalid='ignore'):
+        affordable = np.min(np.where(full_costs > 0, final_bank[:, None, :] / full_costs, np.inf), axis=2)
+    return np.concatenate((batch.get_state(), batch.income*rounds_left, batch.const[:, None], np.sum(mine_types, axis=1), gold, rare,
+                           batch.units[:, :, 0], batch.units[:, :, 1], researched, affordable, batch.get_score()[:, None]), axis=1).astype(np.float32)
+
+
+NUM_FEATURES = leaf_features(BatchGame(1)).shape[1]
+SCORE_FEATURE = NUM_FEATURES - 1 # Column of the score so far.
+
+
+### Models
+class LeafModel:
+    """
+    Dense layers with ReLU between them, on standardized features, predicting a standardized score. A single layer is a linear model.
+    """
+    def __init__(self, layers, x_mean, x_std, y_mean, y_std):
+        self.layers = layers # List of (weights, biases).
+        self.x_mean = x_mean
+        self.x_std = x_std
+        self.y_mean = y_mean
+        self.y_std = y_std
+
+    def predict(self, features):
+        """
+        Predicted final scores for a (N, NUM_FEATURES) feature matrix.
+        """
+        hidden = (features - self.x_mean) / self.x_std
+        for weights, biases in self.layers[:-1]:
+            hidden = np.maximum(hidden @ weights + biases, 0)
+        weights, biases = self.layers[-1]
+        return (hidden @ weights + biases)[:, 0]*self.y_std + self.y_mean
+
+    def evaluate(self, batch):
+        """
+        Predicted final score of every row of a BatchGame, shape (B,).
+        """
+        return self.predict(leaf_features(batch))
+
+    def evaluate_game(self, game):
+        """
+        Predicted final score of a single mnm2.Game.
+        """
+        return float(self.evaluate(single_row(game))[0])
+
+    def save(self, path):
+        arrays = {'x_mean': self.x_mean, 'x_std': self.x_std, 'y_mean': self.y_mean, 'y_std': self.y_std}
+        for index, (weights, biases) in enumerate(self.layers):
+            arrays[f'w{index}'] = weights
+            arrays[f'b{index}'] = biases
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as arrays:
+            layers = [(arrays[f'w{index}'], arrays[f'b{index}']) for index in range(sum(name.startswith('w') for name in arrays.files))]
+            return cls(layers, arrays['x_mean'], arrays['x_std'], arrays['y_mean'], arrays['y_std'])
+
+
+def _standardization(features, scores):
+    x_mean = features.mean(axis=0)
+    x_std = features.std(axis=0)
+    x_std[x_std == 0] = 1 # Constant features, e.g. tables that never change.
+    return x_mean.astype(np.float32), x_std.astype(np.float32), np.float32(scores.mean()), np.float32(max(scores.std(), 1e-6))
+
+
+def fit_ridge(features, scores, alpha=1.0):
+    """
+    Ridge regression in closed form on standardized features.
+    """
+    x_mean, x_std, y_mean, y_std = _standardization(features, scores)
+    inputs = ((features - x_mean) / x_std).astype(np.float64)
+    targets = (scores - y_mean) / y_std
+    weights = np.linalg.solve(inputs.T @ inputs + alpha*np.eye(inputs.shape[1]), inputs.T @ targets)
+    return LeafModel([(weights[:, None].astype(np.float32), np.zeros(1, dtype=np.float32))], x_mean, x_std, y_mean, y_std)
+
+
+def fit_mlp(features, scores, hidden=(64, 64), epochs=30, batch_size=512, learning_rate=1e-3, seed=0, out=None):
+    """
+    MLP trained with Adam on the mean squared error of the standardized score.
+    """
+    rng = np.random.default_rng(seed)
+    x_mean, x_std, y_mean, y_std = _standardization(features, scores)
+    inputs = ((features - x_mean) / x_std).astype(np.float32)
+    targets = ((scores - y_mean) / y_std).astype(np.float32)[:, None]
+
+    sizes = (inputs.shape[1],) + tuple(hidden) + (1,)
+    params = []
+    for fan_in, fan_out in zip(sizes[:-1], sizes[1:]):
+        params += [(rng.standard_normal((fan_in, fan_out))*np.sqrt(2 / fan_in)).astype(np.float32), np.zeros(fan_out, dtype=np.float32)]
+    moments = [np.zeros_like(param) for param in params]
+    squares = [np.zeros_like(param) for param in params]
+    beta1, beta2, step = 0.9, 0.999, 0
+
+    for epoch in range(epochs):
+        order = rng.permutation(len(inputs))
+        for start in range(0, len(order), batch_size):
+            rows = order[start:start+batch_size]
+            # Forward, keeping every layer's input for the backward pass.
+            activations = [inputs[rows]]
+            for layer in range(0, len(params) - 2, 2):
+                activations.append(np.maximum(activations[-1] @ params[layer] + params[layer+1], 0))
+            error = (activations[-1] @ params[-2] + params[-1] - targets[rows]) * (2 / len(rows))
+
+            grads = [None]*len(params)
+            for layer in range(len(params) - 2, -1, -2):
+                grads[layer] = activations[layer // 2].T @ error
+                grads[layer+1] = error.sum(axis=0)
+                if layer:
+                    error = (error @ params[layer].T) * (activations[layer // 2] > 0)
+
+            step += 1
+            for param, grad, moment, square in zip(params, grads, moments, squares):
+                moment *= beta1
+                moment += (1 - beta1)*grad
+                square *= beta2
+                square += (1 - beta2)*grad*grad
+                param -= learning_rate * (moment / (1 - beta1**step)) / (np.sqrt(square / (1 - beta2**step)) + 1e-8)
+        if out is not None:
+            model = LeafModel(list(zip(params[::2], params[1::2])), x_mean, x_std, y_mean, y_std)
+            print(f"Epoch {epoch+1}: train MAE {np.mean(np.abs(model.predict(features) - scores)):.3f}", file=out, flush=True)
+    return LeafModel(list(zip(params[::2], params[1::2])), x_mean, x_std, y_mean, y_std)
+
+
+### Data
+def exploring_policy(epsilon, explore_steps):
+    """
+    roi_policy, except that for its first explore_steps[row] steps each row plays a random legal action with probability epsilon[row].
+    """
+    def policy(batch, rng):
+        explore = (rng.random(batch.batch_size) < epsilon) & (batch.num_steps < explore_steps)
+        return np.where(explore, batch_random_policy(batch, rng), roi_policy(batch))
+    return policy
+
+
+def generate_dataset(num_games, seed=0, max_epsilon=0.3, max_explore_steps=300, every=4, keep_states=0):
+    """
+    Plays num_games games with exploring_policy (per game epsilon uniform in [0, max_epsilon], exploration steps uniform in [0, max_explore_steps]).
+    Every `every` steps, records the features of the games that are done exploring and not finished. Their final score is then the score roi_policy reaches from the recorded state, the value a rollout would give.
+    Returns (features, final scores, kept): kept is None, or (BatchGame of up to keep_states of the recorded states, their rows in features).
+    """
+    rng = np.random.default_rng(seed)
+    batch = BatchGame(num_games)
+    explore_steps = rng.integers(0, max_explore_steps + 1, num_games)
+    policy = exploring_policy(rng.uniform(0, max_epsilon, num_games), explore_steps)
+    features, games, states, state_rows = [], [], [], []
+    keep_probability = keep_states / (num_games * 20) # Most games leave more than 20 snapshots.
+    while not np.all(batch.done()):
+        if batch.num_steps % every == 0:
+            rows = np.nonzero(~batch.done() & (batch.num_steps >= explore_steps))[0]
+            kept = np.nonzero(rng.random(len(rows)) < keep_probability)[0]
+            if kept.size:
+                states.append(batch.take(rows[kept]))
+                state_rows.append(sum(map(len, games)) + kept)
+            features.append(leaf_features(batch)[rows])
+            games.append(rows)
+        batch.step(np.where(batch.done(), -1, policy(batch, rng)))
+    features = np.concatenate(features)
+    scores = batch.get_score()[np.concatenate(games)].astype(np.float32)
+    if not states:
+        return features, scores, None
+    states = BatchGame.concatenate(states)
+    keep = np.arange(min(keep_states, states.batch_size))
+    return features, scores, (states.take(keep), np.concatenate(state_rows)[keep])
+
+
+### Report
+def accuracy(predictions, scores):
+    errors = predictions - scores
+    return np.mean(np.abs(errors)), 1 - np.mean(errors**2) / np.var(scores)
+
+
+def report(models, num_games=1024, seed=1, rollout_states=1024, out=sys.stdout):
+    """
+    Prints MAE and R^2 of every model against the true final scores of freshly simulated games, and the time per leaf, next to a roi_policy rollout from the same states.
+    Two baselines come first: the mean training score (of the first model) for every state, and the score so far.
+    Timings and the rollout row are left out when no states were kept for them (rollout_states 0, or very few games).
+    """
+    features, scores, kept = generate_dataset(num_games, seed, keep_states=rollout_states)
+    states, state_rows = kept if kept is not None else (None, None)
+    leaves = 0 if states is None else states.batch_size
+    print(f"{len(features)} test states from {num_games} games, timings on {leaves} of them", file=out)
+    print(f"{'estimator':>24} {'MAE':>8} {'R^2':>8} {'us/leaf':>10}", file=out)
+    mean = models[0][1].y_mean if models else scores.mean()
+    for name, predictions in (('constant mean', np.full(len(scores), mean)), ('score so far', features[:, SCORE_FEATURE])):
+        mae, r2 = accuracy(predictions, scores)
+        print(f"{name:>24} {mae:8.3f} {r2:8.3f} {'-':>10}", file=out)
+    for name, model in models:
+        mae, r2 = accuracy(model.predict(features), scores)
+        if states is None:
+            print(f"{name:>24} {mae:8.3f} {r2:8.3f} {'-':>10}", file=out)
+            continue
+        start = time.perf_counter()
+        model.evaluate(states)
+        seconds = time.perf_counter() - start
+        print(f"{name:>24} {mae:8.3f} {r2:8.3f} {1e6*seconds / leaves:10.2f}", file=out)
+
+    if states is not None:
+        rollouts = states.take(np.arange(leaves))
+        start = time.perf_counter()
+        play_batch(rollouts, lambda batch, rng: roi_policy(batch))
+        seconds = time.perf_counter() - start
+        mae, r2 = accuracy(rollouts.get_score(), scores[state_rows])
+        print(f"{'roi rollout (batched)':>24} {mae:8.3f} {r2:8.3f} {1e6*seconds / leaves:10.2f}", file=out)
+
+    if models:
+        game = Game(Game.mines, Game.mine_upgrades, Game.sends, Game.units)
+        start = time.perf_counter()
+        for _ in range(100):
+            models[0][1].evaluate_game(game)
+        print(f"Single Game evaluation with {models[0][0]}: {1e4*(time.perf_counter() - start):.1f} us", file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Fit and compare learned leaf evaluators for Mines and Magic.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    fit = subparsers.add_parser('fit')
+    fit.add_argument('--model', choices=('ridge', 'mlp'), default='mlp')
+    fit.add_argument('--games', type=int, default=4096, help='Simulated games to take training states from.')
+    fit.add_argument('--seed', type=int, default=0)
+    fit.add_argument('--max-epsilon', type=float, default=0.3, help='Largest per game rate of random actions.')
+    fit.add_argument('--max-explore-steps', type=int, default=300, help='Largest per game number of steps that may be random.')
+    fit.add_argument('--alpha', type=float, default=1.0, help='Ridge penalty.')
+    fit.add_argument('--hidden', type=int, nargs='*', default=[64, 64], help='MLP hidden layer sizes.')
+    fit.add_argument('--epochs', type=int, default=30)
+    fit.add_argument('--out', default='leaf.npz')
+    report_parser = subparsers.add_parser('report')
+    report_parser.add_argument('models', nargs='+', help='.npz files written by fit.')
+    report_parser.add_argument('--games', type=int, default=1024)
+    report_parser.add_argument('--seed', type=int, default=1, help='Use a different seed than the training data.')
+    args = parser.parse_args(argv)
+
+    if args.command == 'report':
+        report([(path, LeafModel.load(path)) for path in args.models], args.games, args.seed)
+        return 0
+
+    start = time.perf_counter()
+    features, scores, _ = generate_dataset(args.games, args.seed, args.max_epsilon, args.max_explore_steps)
+    print(f"{len(features)} training states from {args.games} games in {time.perf_counter() - start:.1f}s")
+    if args.model == 'ridge':
+        model = fit_ridge(features, scores, args.alpha)
+    else:
+        model = fit_mlp(features, scores, args.hidden, args.epochs, seed=args.seed, out=sys.stdout)
+    mae, r2 = accuracy(model.predict(features), scores)
+    model.save(args.out)
+    print(f"Train MAE {mae:.3f}, R^2 {r2:.3f}. Wrote {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
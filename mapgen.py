@@ -0,0 +1,81 @@
+"""
+Seeded random map generation for mnm2.Game.
+
+In Mines and Magic the mine layout is random each game, but Game.mine_configs (and mnm.map_mines) is a single fixed layout. Here maps are sampled as (type, construction yard tier) layouts, and the derived mines / mine_upgrades tables are built for a whole batch of maps in one vectorized call:
+
+configs, mines, mine_upgrades = sample_maps(10000, seed=1)
+game = make_game(mines[0], mine_upgrades[0])
+
+Maps keep the fixed map's shape (5 tiers of 7 mines) by default so they share Game.action_space.
+"""
+
+import numpy as np
+
+from mnm2 import Game
+
+
+MAP_TIERS = 5
+MINES_PER_TIER = 7
+
+
+def sample_map_configs(num_maps, seed=None, tiers=MAP_TIERS, mines_per_tier=MINES_PER_TIER, replace=True):
+    """
+    Samples (num_maps, tiers*mines_per_tier, 2) mine configs, sorted by construction yard tier and then by type.
+    With replace=True each mine's type is drawn uniformly, otherwise each tier holds distinct types (needs mines_per_tier <= 7).
+    seed can be anything np.random.default_rng accepts, including a Generator.
+    """
+    rng = np.random.default_rng(seed)
+    if replace:
+        mine_types = rng.integers(7, size=(num_maps, tiers, mines_per_tier))
+    else:
+        if mines_per_tier > 7:
+            raise ValueError("Can't place more than 7 distinct mine types in a tier")
+        all_types = np.broadcast_to(np.arange(7), (num_maps, tiers, 7))
+        mine_types = rng.permuted(all_types, axis=-1)[..., :mines_per_tier]
+    mine_types = np.sort(mine_types, axis=-1)
+
+    configs = np.empty((num_maps, tiers, mines_per_tier, 2), dtype=np.int64)
+    configs[..., 0] = mine_types
+    configs[..., 1] = np.arange(1, tiers+1)[:, None]
+    return configs.reshape(num_maps, tiers*mines_per_tier, 2)
+
+
+def build_tables(configs):
+    """
+    Returns (mines, mine_upgrades) for one map or a batch of maps, the same tables Game builds for Game.mine_configs.
+    """
+    return Game.mine_tables_generator(configs, Game.MINE_BASE_INCOMES, Game.MINE_BASE_GOLD_UPGRADE_COST, Game.MINE_RARE_UPCGRADE_COSTS)
+
+
+def sample_maps(num_maps, seed=None, **kwargs):
+    """
+    Samples num_maps maps and returns (configs, mines, mine_upgrades) with a leading map axis.
+    """
+    configs = sample_map_configs(num_maps, seed, **kwargs)
+    mines, mine_upgrades = build_tables(configs)
+    return configs, mines, mine_upgrades
+
+
+def generate_map(seed=None, **kwargs):
+    """
+    Samples a single map. Returns (configs, mines, mine_upgrades) without the map axis.
+    """
+    configs, mines, mine_upgrades = sample_maps(1, seed, **kwargs)
+    return configs[0], mines[0], mine_upgrades[0]
+
+
+def make_game(mines, mine_upgrades, sends=Game.sends, units=Game.units):
+    """
+    Starts a new Game on the given map tables.
+    """
+    if mines.shape[0] != Game.num_mines:
+        raise ValueError(f"Game.action_space is built for {Game.num_mines} mines, map has {mines.shape[0]}")
+    return Game(mines, mine_upgrades, sends, units)
+
+
+def to_map_mines(configs):
+    """
+    Converts a map config to a list of mnm.Mine for the original mnm.GameState model.
+    """
+    import mnm
+    return [mnm.Mine(int(mine_type), int(const)) for mine_type, const in configs]
@@ -63,29 +63,31 @@ class Game:
         (SUBDOLAK, 5)
     ))
 
-    num_mines = mine_configs.shape[0]
-
-    mines = np.zeros((num_mines, 17), dtype=np.float32)
-    mines[:, 0:2] = mine_configs
-    mines[:, 10:] = MINE_BASE_INCOMES[mines[:,0].astype(np.int32)]
-
-    # Mine ID, mine type, mine owned, upgrade resource, upgrade costs (7)
-
-    # Help 
-    mine_upgrades = np.zeros((num_mines*7, 11))
+    def mine_tables_generator(mine_configs, base_incomes, base_gold_upgrade_cost, rare_upgrade_costs):
+        """
+        Builds the mines and mine_upgrades tables from (type, const) mine configs.
+        Works on a single map of shape (num_mines, 2) or on a batch of maps of shape (..., num_mines, 2).
+        """
+        mine_configs = np.asarray(mine_configs)
+        batch_shape, num_mines = mine_configs.shape[:-2], mine_configs.shape[-2]
+        mine_types = mine_configs[..., 0].astype(np.int32)
+
+        # Mine type, construction yards needed, owned, upgrades (7), income (7)
+        mines = np.zeros(mine_configs.shape[:-1] + (17,), dtype=np.float32)
+        mines[..., 0:2] = mine_configs
+        mines[..., 10:] = base_incomes[mine_types]
+
+        # Mine ID, mine type, upgrade available, upgrade resource, upgrade costs (7)
+        mine_upgrades = np.zeros(batch_shape + (num_mines, 7, 11))
+        mine_upgrades[..., 0] = np.arange(num_mines)[:, None]
+        mine_upgrades[..., 1] = mine_types[..., None]
+        mine_upgrades[..., 3] = np.arange(7)
+        mine_upgrades[..., 4:] = np.diag(rare_upgrade_costs) # Each rare upgrade costs its own resource.
+        mine_upgrades[..., 0, 4] = base_gold_upgrade_cost[mine_types] # Different for manas
+        return mines, mine_upgrades.reshape(batch_shape + (num_mines*7, 11))
 
-    for num, mine in enumerate(mines):
-        mine_upgrades[7*num:7*num+7,0] = num
-        mine_upgrades[7*num:7*num+7,1] = mine[0]
-        mine_upgrades[7*num:7*num+7,2] = 0
-        mine_upgrades[7*num:7*num+7,3] = [0,1,2,3,4,5,6]
-        mine_upgrades[7*num,4] = MINE_BASE_GOLD_UPGRADE_COST[int(mine[0])] # dufferebt fir nabas
-        mine_upgrades[7*num+1,5] = 7
-        mine_upgrades[7*num+2,6] = 7
-        mine_upgrades[7*num+3,7] = 18
-        mine_upgrades[7*num+4,8] = 5
-        mine_upgrades[7*num+5,9] = 5
-        mine_upgrades[7*num+6,10] = 5
+    num_mines = mine_configs.shape[0]
+    mines, mine_upgrades = mine_tables_generator(mine_configs, MINE_BASE_INCOMES, MINE_BASE_GOLD_UPGRADE_COST, MINE_RARE_UPCGRADE_COSTS)
 
     # Sends
     SEND_CONFIG = (
@@ -153,6 +155,8 @@ class Game:
         'Robotron'
     )
 
+    FINAL_ROUND = 38 # Game ends once round 37 is over.
+
     action_space = None
     action_dict = None
 
@@ -196,7 +200,19 @@ class Game:
         )
       
     def __str__(self):
-        return f'Round {self.round}. Bank: {self.bank}, Income +{self.income}' 
+        return f'Round {self.round}. Bank: {self.bank}, Income +{self.income}'
+
+    def copy(self):
+        """
+        Returns an independent copy of the game, used by search to branch off a state.
+        """
+        game = Game.__new__(Game)
+        game.__dict__.update(self.__dict__)
+        for name in ('bank', 'income', 'const_cost', 'units', 'sends', 'mines', 'mine_purchase_cost', 'mine_upgrades'):
+            setattr(game, name, getattr(self, name).copy())
+        game.moves_performed = self.moves_performed.copy()
+        game.action_types = tuple(getattr(game, method.__name__) for method in self.action_types) # Rebind to the copy.
+        return game
 
     # General
     def get_score(self):
@@ -232,7 +248,7 @@ class Game:
 
     # Units
     def purchase_unit(self, unit_id): # Main action 2
-        cost = self.units[unit_id, 9:16]
+        cost = self.units[unit_id, 9:16].copy() # Copy so research cost is not added to the unit table.
         if np.sum(self.units[unit_id, :2]) == 0: # Need to research
             cost += self.units[unit_id, 2:9] 
         self.bank -= cost            
@@ -257,10 +273,10 @@ class Game:
         return f"-> Upgraded unit {Game.UNIT_NAMES[unit_id]}"
     
     def get_upgradable_units(self): # Needs to have at least one unupgraded and affordable. Returns tuple of actions?
-        have_base_unit = self.units[:, 0] > 0
+        have_base_unit = np.nonzero(self.units[:, 0] > 0)[0]
         costs = self.units[have_base_unit, 16:]
         affordable_upgrades = self.affordable(costs)
-        affordable_upgrades_indices = np.nonzero(affordable_upgrades)[0]
+        affordable_upgrades_indices = have_base_unit[affordable_upgrades] # Map back to unit ids.
         return tuple((3, (unit_id,)) for unit_id in affordable_upgrades_indices)
 
     # Sends
@@ -289,10 +305,10 @@ class Game:
         if self.mines[mine_id,0] == Game.FOOD: 
             self.bank[0] -= 10
         else:
-            if self.owned_mines <= 6:
-                self.mine_purchase_cost[0] = Game.MINE_PURCHASE_COST_VALS[self.owned_mines]
             self.bank[0] -= self.mine_purchase_cost[0]
             self.owned_mines += 1
+            if self.owned_mines <= 6: # Next mine costs more, up to the cap.
+                self.mine_purchase_cost[0] = Game.MINE_PURCHASE_COST_VALS[self.owned_mines]
 
         self.income += self.mines[mine_id,10:]
         self.mine_upgrades[7*mine_id:7*mine_id+7,2] = 1
@@ -431,7 +447,7 @@ class Game:
         Implements a human interface to play a full game. Keeps looping until end of round 37 or player types exit.
         """
         print(str(self)) # Print initial bank/income/etc.
-        while self.round < 38: # Keep playing until we reach end of round 37.
+        while self.round < Game.FINAL_ROUND: # Keep playing until we reach end of round 37.
             for possible_action in self.actions_available:
                 print(f'{possible_action}: {self.action_int_to_text(possible_action)}')
             action = self.input_action() # Ask for an action.
@@ -446,6 +462,10 @@ class Game:
 
     
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] == 'simulate': # Headless batch mode.
+        import simulate
+        return simulate.main(sys.argv[2:])
+
     while True: # Keep playing games until player exists.
         print("Starting new game!") 
         gs = Game(Game.mines, Game.mine_upgrades, Game.sends, Game.units)
@@ -0,0 +1,252 @@
+"""
+Opening book for the early rounds of mnm2.Game.
+
+Every search and rollout passes through the same first rounds (round 1-7 sends, the first mines and construction yards) and solves them again each run. The book stores the best known action sequence and value for early-round states, keyed by a canonical hash of the state, so a planner can look its position up in O(1) and start searching from a strong position around round 8.
+
+The book is built offline by a round-by-round beam search: every distinct state reachable within a round is enumerated, the best states at the end of each round are kept, and the states left at the horizon are scored with greedy rollouts. Values are then backed up to every state on the kept lines.
+
+It is stored as an open addressing hash table in a .npy file, which OpeningBook.load memory-maps:
+
+python opening_book.py build --rounds 8 --beam 16 --out book.npy
+python mnm2.py simulate --policy greedy --book book.npy
+"""
+
+import argparse
+import hashlib
+import sys
+import time
+from collections import deque
+
+import numpy as np
+
+from mnm2 import Game
+import simulate
+
+
+MAX_ACTIONS = 24 # Longest action sequence stored per entry.
+BOOK_DTYPE = np.dtype([
+    ('key', '<u8'), # 0 marks an empty slot.
+    ('value', '<f4'),
+    ('length', 'u1'),
+    ('actions', '<i2', (MAX_ACTIONS,)),
+])
+
+
+def state_key(game):
+    """
+    Returns a 64 bit hash of everything that matters for the rest of the game: the map (mine types and tiers), round, yards, bank, income, owned/upgraded mines and units.
+    States of different maps get different keys, so a book built on one map misses on any other. Transpositions (the same purchases in a different order) get the same key. Never 0.
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(np.ascontiguousarray(game.mines[:, 0:2], dtype=np.float32).tobytes())
+    digest.update(np.array((game.round, game.const, game.owned_mines), dtype=np.int64).tobytes())
+    digest.update(game.bank.astype(np.float32).tobytes())
+    digest.update(game.income.astype(np.float32).tobytes())
+    digest.update(np.ascontiguousarray(game.mines[:, 2:10], dtype=np.float32).tobytes())
+    digest.update(np.ascontiguousarray(game.units[:, :2], dtype=np.float32).tobytes())
+    return int.from_bytes(digest.digest(), 'little') or 1
+
+
+class OpeningBook:
+    """
+    Hash table of book entries. table is a BOOK_DTYPE array whose size is a power of two; entries are found by linear probing from key & (size-1).
+    """
+    def __init__(self, table):
+        self.table = table
+        self.mask = len(table) - 1
+
+    def __len__(self):
+        return int(np.count_nonzero(self.table['key']))
+
+    @classmethod
+    def from_entries(cls, entries, load=0.5):
+        """
+        Builds a book from a dict of key -> (value, actions).
+        """
+        size = 1
+        while size*load < max(len(entries), 1):
+            size *= 2
+        book = cls(np.zeros(size, dtype=BOOK_DTYPE))
+        for key, (value, actions) in entries.items():
+            book.insert(key, value, actions)
+        return book
+
+    def _slot(self, key):
+        slot = key & self.mask
+        while True:
+            slot_key = int(self.table['key'][slot])
+            if slot_key == key or slot_key == 0:
+                return slot
+            slot = (slot + 1) & self.mask
+
+    def insert(self, key, value, actions):
+        if len(actions) > MAX_ACTIONS:
+            raise ValueError(f"Book entries hold at most {MAX_ACTIONS} actions")
+        entry = self.table[self._slot(key)]
+        entry['key'] = key
+        entry['value'] = value
+        entry['length'] = len(actions)
+        entry['actions'][:len(actions)] = actions
+
+    def lookup(self, key):
+        """
+        Returns (value, actions) for a key, or None if the state is not in the book.
+        """
+        entry = self.table[self._slot(key)]
+        if entry['key'] == 0:
+            return None
+        return float(entry['value']), tuple(int(action) for action in entry['actions'][:entry['length']])
+
+    def query(self, game):
+        return self.lookup(state_key(game))
+
+    def save(self, path):
+        np.save(path, self.table)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        return cls(np.load(path, mmap_mode='r' if mmap else None))
+
+
+### Building
+OPENING_ACTION_TYPES = (1, 4, 5, 6) # Units are not worth buying in the opening.
+
+
+def expand_round(game, max_states):
+    """
+    Enumerates the distinct states reachable from game within its round (breadth first, up to max_states).
+    Returns a list of (state, actions) where actions ends with moving to the next round.
+    """
+    seen = {state_key(game)}
+    queue = deque([(game, ())])
+    ends = []
+    while queue:
+        state, actions = queue.popleft()
+        end = state.copy()
+        end.perform_action(0)
+        end.actions_available = end.get_available_actions()
+        ends.append((end, actions + (0,)))
+        for action in state.actions_available:
+            if Game.action_space[action][0] not in OPENING_ACTION_TYPES or len(seen) >= max_states:
+                continue
+            child = state.copy()
+            child.perform_action(action)
+            child.actions_available = child.get_available_actions()
+            key = state_key(child)
+            if key not in seen:
+                seen.add(key)
+                queue.append((child, actions + (action,)))
+    return ends
+
+
+def heuristic_value(game, rates=simulate.GREEDY_RATES):
+    """
+    Gold value of the bank plus the income it will still collect, used to rank states between rounds.
+    """
+    return float(rates @ (game.bank + game.income*(Game.FINAL_ROUND - game.round)))
+
+
+def rollout_value(game, policy=simulate.greedy_policy, rng=None):
+    """
+    Plays a copy of game to the end with policy and returns its get_score.
+    """
+    game = game.copy()
+    simulate.play_game(game, policy, np.random.default_rng(rng))
+    return float(game.get_score())
+
+
+def build_book(rounds=8, beam=16, max_states=2000, out=sys.stdout):
+    """
+    Beam searches the opening up to the start of round `rounds` and returns an OpeningBook with an entry for every state on the kept lines.
+    """
+    root = Game(Game.mines, Game.mine_upgrades, Game.sends, Game.units)
+    start = time.perf_counter()
+    frontier = [root]
+    kept_states = {state_key(root): root}
+    parents = {} # key of a round start state -> (key of the previous round start state, actions that lead to it)
+    layers = [[state_key(root)]]
+    for round_num in range(1, rounds):
+        children = {}
+        for state in frontier:
+            parent_key = state_key(state)
+            for child, actions in expand_round(state, max_states):
+                key = state_key(child)
+                if key not in children:
+                    children[key] = (heuristic_value(child), child)
+                    parents[key] = (parent_key, actions)
+        kept = sorted(children.items(), key=lambda item: -item[1][0])[:beam]
+        frontier = [child for key, (value, child) in kept]
+        kept_states.update((key, child) for key, (value, child) in kept)
+        layers.append([key for key, item in kept])
+        print(f"Round {round_num}: {len(children)} distinct round end states, kept {len(frontier)}. {time.perf_counter() - start:.1f}s", file=out, flush=True)
+
+    # Score the horizon, then back values up the kept lines.
+    values = {state_key(state): rollout_value(state) for state in frontier}
+    best_actions = {}
+    for layer in reversed(layers[1:]):
+        for key in layer:
+            if key not in values:
+                continue
+            parent, actions = parents[key]
+            if values[key] > values.get(parent, -np.inf):
+                values[parent] = values[key]
+                best_actions[parent] = actions
+
+    # Store every state along each best line, with the rest of that round's actions.
+    entries = {}
+    for layer in layers[:-1]:
+        for key in layer:
+            if key not in best_actions:
+                continue
+            state, actions = kept_states[key].copy(), best_actions[key]
+            for position, action in enumerate(actions):
+                entries[state_key(state)] = (values[key], actions[position:][:MAX_ACTIONS])
+                state.perform_action(action)
+                state.actions_available = state.get_available_actions()
+    print(f"Book has {len(entries)} entries, best value {values[state_key(root)]:g}. {time.perf_counter() - start:.1f}s", file=out, flush=True)
+    return OpeningBook.from_entries(entries)
+
+
+class BookPolicy:
+    """
+    Plays book moves while the game is in the book, then hands over to the fallback policy.
+    """
+    def __init__(self, book, fallback):
+        self.book = book
+        self.fallback = fallback
+
+    def __call__(self, game, rng):
+        entry = self.book.query(game)
+        if entry is not None and entry[1] and entry[1][0] in game.actions_available:
+            return entry[1][0]
+        return self.fallback(game, rng)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build or inspect a Mines and Magic opening book.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser('build')
+    build.add_argument('--rounds', type=int, default=8, help='Book covers play until the start of this round.')
+    build.add_argument('--beam', type=int, default=16, help='States kept at the end of each round.')
+    build.add_argument('--max-states', type=int, default=2000, help='States enumerated per round expansion.')
+    build.add_argument('--out', default='book.npy')
+    info = subparsers.add_parser('info')
+    info.add_argument('book')
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        book = build_book(args.rounds, args.beam, args.max_states)
+        book.save(args.out)
+        print(f"Wrote {args.out}")
+    else:
+        book = OpeningBook.load(args.book)
+        root = Game(Game.mines, Game.mine_upgrades, Game.sends, Game.units)
+        print(f"{len(book)} entries in {len(book.table)} slots ({book.table.nbytes} bytes)")
+        entry = book.query(root)
+        if entry is not None:
+            print(f"Root value {entry[0]:g}, opening moves: {' '.join(root.action_int_to_text(action) for action in entry[1])}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
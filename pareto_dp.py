@@ -0,0 +1,248 @@
+"""
+Round by round dynamic programming over Pareto frontiers of game states.
+
+Resources only flow on next_round, so the game is staged by round. The solver keeps a frontier of states at the start of each round, as rows of one BatchGame. Within the round it expands every state's spend options layer by layer (legal actions minus the ones dominance.py proves useless), and every state along the way may end the round. The round's end states are then merged and pruned to the ones no other state dominates on
+  (bank, income, construction yards, upgrade potential, score, researched units, base units of each type)
+where upgrade potential is the number of mine upgrades still available on owned mines, and the base unit counts stand for the unit upgrades still to be bought. Identical vectors keep one state.
+
+Dominance checks are vectorized over blocks of states. When too many states survive, states within a round are cut by a cheap heuristic (score plus the points the resources could still buy) and the round's end states by the final score of a batched roi_policy rollout; the round is then reported as capped. A run where no round is capped only pruned by dominance on these summaries, so the per round frontier sizes and RSS show how large a cap a RAM budget allows. That is still not a proof of optimality: the summaries leave out which mines are owned and what their upgrades and the next mine or yard cost, so a pruned state can occasionally have been the better one. The best rollout seen is kept as an incumbent, so a capped run never returns less than it.
+
+python pareto_dp.py --cap 200 --out dp_schedule.txt # About 15 minutes.
+python pareto_dp.py --cap 200 --leaf-model leaf_mlp.npz # Rank with a leaf_eval model instead of rollouts: far cheaper per state, but a much coarser ranking (R^2 about 0.35, see leaf_eval.py).
+python mnm2.py simulate --policy file --policy-file dp_schedule.txt --games 1
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from batch import ACTION_OFFSETS, BatchGame
+from dominance import dominance_mask
+from leaf_eval import LeafModel
+from mnm2 import Game
+from roi import roi_policy
+from search_run import rss_bytes
+
+
+def state_vectors(batch):
+    """
+    The vectors states are compared on, shape (B, 17 + 2*num_units). Larger is better in every column.
+    """
+    owned = batch.mines[:, :, 2] > 0
+    gold_caps = np.where(batch.mines[:, :, 0] == Game.MANA, batch.gold_upgrade_costs_mana.shape[1], batch.gold_upgrade_costs_default.shape[1])
+    rare_left = np.sum(batch.mine_upgrades[:, :, 2].reshape(batch.batch_size, -1, 7)[:, :, 1:], axis=2)
+    potential = np.sum(owned*(gold_caps - batch.mines[:, :, 3] + rare_left), axis=1)
+    researched = np.sum(batch.units[:, :, :2], axis=2) > 0
+    return np.concatenate((batch.bank, batch.income, batch.const[:, None], potential[:, None], batch.get_score()[:, None], researched, batch.units[:, :, 0]), axis=1).astype(np.float64)
+
+
+WEALTH_DISCOUNT = 0.95 # Points not yet bought are worth a bit less than points scored, so buying beats waiting.
+
+
+def heuristic_values(batch):
+    """
+    Score plus the points the bank and the income still to come could buy: the number of times they cover buying and upgrading the best unit, times 10.
+    Units not upgraded yet count as upgraded, with their upgrade cost taken out of those resources.
+    """
+    units = batch.units
+    research = (np.sum(units[:, :, :2], axis=2) == 0)[:, :, None]*units[:, :, 2:9]
+    full_costs = units[:, :, 9:16] + units[:, :, 16:] + research
+    wealth = batch.bank + batch.income*(Game.FINAL_ROUND - batch.round)[:, None] - np.sum(units[:, :, :1]*units[:, :, 16:], axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        bundles = np.min(np.where(full_costs > 0, wealth[:, None, :] / full_costs, np.inf), axis=2)
+    return batch.get_score() + WEALTH_DISCOUNT*(9*np.sum(units[:, :, 0], axis=1) + 10*np.max(bundles, axis=1))
+
+
+def pareto_front(vectors, block_size=1024):
+    """
+    Sorted indices of the rows of vectors (N, D) that no other row dominates (>= in every column, > in one). Duplicate rows keep the first.
+    """
+    _, first = np.unique(vectors, axis=0, return_index=True)
+    order = first[np.argsort(-vectors[first].sum(axis=1), kind='stable')] # A row can only be dominated by rows with a larger sum.
+    candidates = vectors[order]
+    kept = np.zeros(len(order), dtype=bool)
+    front = candidates[:0]
+    for start in range(0, len(order), block_size):
+        block = candidates[start:start+block_size]
+        dominated = np.zeros(len(block), dtype=bool)
+        for front_start in range(0, len(front), block_size):
+            others = front[front_start:front_start+block_size, None]
+            dominated |= np.any(np.all(others >= block, axis=2) & np.any(others > block, axis=2), axis=0)
+        within = np.all(block[:, None] >= block, axis=2) & np.any(block[:, None] > block, axis=2)
+        dominated |= np.any(within, axis=0)
+        kept[start:start+len(block)] = ~dominated
+        front = np.concatenate((front, block[~dominated]))
+    return np.sort(order[kept])
+
+
+class Frontier:
+    """
+    States as rows of a BatchGame, with the actions that led to each one (padded with -1).
+    """
+    def __init__(self, batch, history):
+        self.batch = batch
+        self.history = history
+
+    def __len__(self):
+        return self.batch.batch_size
+
+    def take(self, rows):
+        return Frontier(self.batch.take(rows), self.history[rows])
+
+    def step(self, actions):
+        self.batch.step(actions)
+        self.history = np.concatenate((self.history, np.asarray(actions, dtype=np.int16)[:, None]), axis=1)
+
+    @staticmethod
+    def concatenate(frontiers):
+        width = max(frontier.history.shape[1] for frontier in frontiers)
+        history = [np.pad(frontier.history, ((0, 0), (0, width - frontier.history.shape[1])), constant_values=-1) for frontier in frontiers]
+        return Frontier(BatchGame.concatenate([frontier.batch for frontier in frontiers]), np.concatenate(history))
+
+    def nbytes(self):
+        arrays = [value for value in self.batch.__dict__.values() if isinstance(value, np.ndarray)]
+        return sum(array.nbytes for array in arrays) + self.history.nbytes
+
+
+def rollout(batch):
+    """
+    Plays roi_policy from every state to the end of the game. Returns (final scores, (B, steps) actions padded with -1).
+    """
+    rollouts = batch.take(np.arange(batch.batch_size))
+    actions = []
+    while not np.all(rollouts.done()):
+        actions.append(np.where(rollouts.done(), -1, roi_policy(rollouts)))
+        rollouts.step(actions[-1])
+    return rollouts.get_score(), np.array(actions, dtype=np.int16).reshape(len(actions), batch.batch_size).T
+
+
+def rollout_values(batch):
+    """
+    Final score of roi_policy played from every state, with heuristic_values breaking ties.
+    """
+    return rollout(batch)[0] + 1e-3*heuristic_values(batch)
+
+
+VALUES = {'rollout': rollout_values, 'heuristic': heuristic_values}
+
+
+def select(frontier, cap, oversample=8, values=heuristic_values):
+    """
+    Rows of the Pareto front of frontier, cut to the cap best by values(batch). Returns (sorted rows, capped).
+    Candidates are first cut to cap*oversample by heuristic value, since the front check is quadratic.
+    """
+    rows = np.arange(len(frontier))
+    capped = False
+    if len(rows) > cap*oversample:
+        rows = np.sort(np.argsort(-heuristic_values(frontier.batch), kind='stable')[:cap*oversample])
+        capped = True
+    rows = rows[pareto_front(state_vectors(frontier.batch)[rows])]
+    if len(rows) > cap:
+        rows = np.sort(rows[np.argsort(-values(frontier.batch.take(rows)), kind='stable')[:cap]])
+        capped = True
+    return rows, capped
+
+
+def expand_round(frontier, cap, oversample=8, values=rollout_values, chunk_size=4096):
+    """
+    Every state reachable from frontier within its round, pruned and moved on to the next round. Returns (frontier, number of states considered, capped).
+    Children are made chunk_size at a time and pruned as they come, so memory stays around cap*oversample states.
+    A state that another end state dominates is not expanded further: the dominating state can copy any of its continuations.
+    Within the round states are cut to cap*oversample by heuristic value, then the end states are cut to cap by values.
+    """
+    ends = frontier.take(np.arange(len(frontier)))
+    layer = ends
+    considered = len(frontier)
+    capped = False
+    while len(layer):
+        mask = layer.batch.legal_mask() & dominance_mask(layer.batch)
+        mask[:, ACTION_OFFSETS[0]] = False
+        parents, actions = np.nonzero(mask)
+        if parents.size == 0:
+            break
+        considered += parents.size
+        children = None
+        for start in range(0, parents.size, chunk_size):
+            chunk = layer.take(parents[start:start+chunk_size])
+            chunk.step(actions[start:start+chunk_size])
+            if children is not None:
+                chunk = Frontier.concatenate([children, chunk])
+            rows, chunk_capped = select(chunk, cap*oversample, 1)
+            children = chunk.take(rows)
+            capped |= chunk_capped
+
+        # Merge the new layer into the round's end states and only go on from the children that survive.
+        merged = Frontier.concatenate([ends, children])
+        rows, merge_capped = select(merged, cap*oversample, 1)
+        capped |= merge_capped
+        ends = merged.take(rows)
+        layer = merged.take(rows[rows >= len(merged) - len(children)])
+    rows, end_capped = select(ends, cap, oversample, values)
+    ends = ends.take(rows)
+    ends.step(np.zeros(len(ends), dtype=np.int64))
+    return ends, considered, capped | end_capped
+
+
+def solve(cap=200, oversample=8, values=rollout_values, out=sys.stdout):
+    """
+    Runs the DP from the start of the game to Game.FINAL_ROUND. Returns (best score, its actions, per round stats).
+    Every round the frontier is also played out with roi_policy, and the best of those games is returned if the frontier ends up worse, so a capped run never does worse than its rollouts.
+    """
+    frontier = Frontier(BatchGame(1), np.empty((1, 0), dtype=np.int16))
+    incumbent = (-np.inf, [])
+    stats = []
+    start = time.perf_counter()
+    while not np.all(frontier.batch.done()):
+        round_num = int(frontier.batch.round[0])
+        scores, continuations = rollout(frontier.batch)
+        best = int(np.argmax(scores))
+        if scores[best] > incumbent[0]:
+            incumbent = (float(scores[best]), [int(action) for action in np.concatenate((frontier.history[best], continuations[best])) if action >= 0])
+        frontier, considered, capped = expand_round(frontier, cap, oversample, values)
+        stats.append({
+            'round': round_num,
+            'states': considered,
+            'frontier': len(frontier),
+            'capped': capped,
+            'best_rollout': incumbent[0],
+            'frontier_bytes': frontier.nbytes(),
+            'rss_bytes': rss_bytes(),
+            'seconds': round(time.perf_counter() - start, 2),
+        })
+        if out is not None:
+            stat = stats[-1]
+            print(f"Round {round_num:2}: {considered:8} states considered, frontier {len(frontier):6}{' (capped)' if capped else ''}, best rollout {incumbent[0]:g}, "
+                  f"{stat['frontier_bytes'] / 2**20:6.1f} MiB frontier, RSS {stat['rss_bytes'] / 2**20:6.0f} MiB, {stat['seconds']:.1f}s", file=out, flush=True)
+    scores = frontier.batch.get_score()
+    best = int(np.lexsort((-heuristic_values(frontier.batch), -scores))[0])
+    if scores[best] < incumbent[0]:
+        return incumbent[0], incumbent[1], stats
+    actions = [int(action) for action in frontier.history[best] if action >= 0]
+    return float(scores[best]), actions, stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Solve Mines and Magic with round by round Pareto frontier DP.')
+    parser.add_argument('--cap', type=int, default=200, help='Most states kept per round and per expansion layer.')
+    parser.add_argument('--oversample', type=int, default=8, help='Candidates cut to cap*oversample by heuristic before the dominance check.')
+    parser.add_argument('--values', choices=VALUES, default='rollout', help='How round end states are ranked when over the cap.')
+    parser.add_argument('--leaf-model', help='Rank round end states with a leaf_eval model (.npz) instead of --values.')
+    parser.add_argument('--out', help='Write the best action schedule here, in the format simulate --policy file reads.')
+    args = parser.parse_args(argv)
+
+    values = LeafModel.load(args.leaf_model).evaluate if args.leaf_model else VALUES[args.values]
+    score, actions, stats = solve(args.cap, args.oversample, values)
+    uncapped = not any(stat['capped'] for stat in stats)
+    print(f"Best score {score:g} with {len(actions)} actions. {'No round capped' if uncapped else 'Capped in some rounds'}, "
+          f"largest frontier {max(stat['frontier'] for stat in stats)}, peak RSS {max(stat['rss_bytes'] for stat in stats) / 2**20:.0f} MiB")
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(f"# score {score:g}, pareto_dp cap {args.cap}, {args.leaf_model or args.values} values\n")
+            f.write(' '.join(str(action) for action in actions) + '\n')
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
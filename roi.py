@@ -0,0 +1,191 @@
+"""
+Precomputed return on investment (ROI) tables and a fast greedy baseline policy.
+
+Every send and every mine upgrade has a fixed cost and a fixed income gain, so their payback time in rounds (cost / income gain, with resources valued at exchange rates) can be tabulated up front. The income an upgrade adds only depends on the mine type and upgrade state (gold upgrades, rare upgrades), so it is precomputed in UPGRADE_GAIN, and roi_policy divides each row's own costs by it to pick, for every row of a BatchGame at once, the legal investment that pays back fastest. A construction yard is valued through the mines of the tier it unlocks. Once nothing pays back before the game ends, or from round ROI_ECO_UNTIL on, it spends on units. No search is involved, so it serves as a baseline and as a rollout policy for heavier planners. It is only cheap batched (about 70 games/sec over 4096 rows): game_policy runs it on one mnm2.Game at a time through a one row batch, which is slower than simulate.greedy_policy.
+
+python roi.py --games 4096 # Print the tables and benchmark the policy.
+python mnm2.py simulate --policy roi
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from batch import ACTION_OFFSETS, ACTION_TYPES, BatchGame, NUM_ACTIONS, play_batch, single_row
+from mnm2 import Game
+
+
+# Gold value of one unit of each resource.
+ROI_RATES = np.array((1, 3, 3, 1, 3, 3, 3), dtype=np.float64)
+
+# Round from which roi_policy stops investing and only buys units. Paybacks value every resource at ROI_RATES, but the last rounds' income has to come in the resources units cost, so late investments that pay back on paper rarely become points.
+ROI_ECO_UNTIL = 30
+
+MAX_GOLD_UPGRADES = len(Game.MINE_GOLD_UPGRADE_COSTS_MANA)
+MAX_RARE_UPGRADES = 6
+
+
+def _build_income_table():
+    """
+    MINE_INCOME[mine type, gold upgrades, rare upgrades], rounded like Game.upgrade_mine.
+    Has one extra gold and rare level so the gain of the last upgrade can be looked up.
+    """
+    mine_types = np.arange(7)[:, None, None]
+    gold = np.arange(MAX_GOLD_UPGRADES + 2)[None, :, None]
+    rare = np.arange(MAX_RARE_UPGRADES + 2)[None, None, :]
+    return np.round((Game.MINE_BASE_INCOMES[mine_types, mine_types] + gold) * (1 + 0.2*rare), 1)
+
+
+MINE_INCOME = _build_income_table()
+
+# UPGRADE_GAIN[mine type, gold upgrades, rare upgrades, upgrade resource]: income gained in the mine's own resource.
+UPGRADE_GAIN = np.empty((7, MAX_GOLD_UPGRADES + 1, MAX_RARE_UPGRADES + 1, 7))
+UPGRADE_GAIN[..., 0] = MINE_INCOME[:, 1:, :-1] - MINE_INCOME[:, :-1, :-1]
+UPGRADE_GAIN[..., 1:] = (MINE_INCOME[:, :-1, 1:] - MINE_INCOME[:, :-1, :-1])[..., None]
+
+
+def send_paybacks(sends=Game.sends, rates=ROI_RATES):
+    """
+    Payback in rounds of every send, shape (..., num_sends).
+    """
+    return (sends[..., 2:] @ rates) / (sends[..., 1]*rates[0])
+
+
+def upgrade_paybacks(rates=ROI_RATES):
+    """
+    Payback in rounds of every mine upgrade, indexed [mine type, gold upgrades, rare upgrades, upgrade resource], with the default upgrade costs, inf where the upgrade is not possible.
+    """
+    gold_costs = np.full((7, MAX_GOLD_UPGRADES + 1), np.inf)
+    for mine_type in range(7):
+        costs = Game.MINE_GOLD_UPGRADE_COSTS_MANA if mine_type == Game.MANA else Game.MINE_GOLD_UPGRADE_COSTS_DEFAULT
+        gold_costs[mine_type, :len(costs)] = costs
+    costs = np.empty(UPGRADE_GAIN.shape)
+    costs[..., 0] = gold_costs[:, :, None]*rates[0]
+    costs[..., 1:] = (np.array(Game.MINE_RARE_UPCGRADE_COSTS)*rates)[1:]
+    costs[:, :, MAX_RARE_UPGRADES, 1:] = np.inf # All rare upgrades done.
+    gains = UPGRADE_GAIN*rates[:, None, None, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(gains > 0, costs / gains, np.inf)
+
+
+UNIT_ACTIONS = np.isin(ACTION_TYPES, (2, 3))
+UNIT_SCORES = np.where(ACTION_TYPES == 3, 9, 1) # Upgrading swaps a 1 point unit for a 10 point unit.
+
+
+def unit_values(batch, rates=ROI_RATES):
+    """
+    Score per cost of every unit action for every row, shape (B, NUM_ACTIONS). 0 for other actions.
+    """
+    need_to_research = np.sum(batch.units[:, :, :2], axis=2) == 0
+    purchase_costs = batch.units[:, :, 9:16] + need_to_research[:, :, None]*batch.units[:, :, 2:9]
+    costs = np.concatenate((purchase_costs, batch.units[:, :, 16:]), axis=1) # Unit actions are all purchases, then all upgrades.
+    values = np.zeros((batch.batch_size, NUM_ACTIONS))
+    values[:, UNIT_ACTIONS] = UNIT_SCORES[UNIT_ACTIONS] / np.maximum(costs @ rates, 1e-6)
+    return values
+
+
+def action_paybacks(batch, rates=ROI_RATES):
+    """
+    Payback in rounds of every economy action for every row, shape (B, NUM_ACTIONS). inf for actions that return nothing.
+    Costs come from each row's own tables, so rows with swept balance constants are valued correctly.
+    """
+    batch_size, num_mines = batch.mines.shape[:2]
+    payback = np.full((batch_size, NUM_ACTIONS), np.inf)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Sends
+        num_sends = batch.sends.shape[1]
+        payback[:, ACTION_OFFSETS[4]:ACTION_OFFSETS[4]+num_sends] = send_paybacks(batch.sends, rates)
+
+        # Mines
+        food_mines = batch.mines[:, :, 0] == Game.FOOD
+        purchase_costs = np.where(food_mines, Game.MINE_FOOD_PURCHASE_COST @ rates, (batch.mine_purchase_cost @ rates)[:, None])
+        mine_gains = batch.mines[:, :, 10:] @ rates
+        payback[:, ACTION_OFFSETS[5]:ACTION_OFFSETS[5]+num_mines] = purchase_costs / mine_gains
+
+        # Mine upgrades, the only cost entry is the upgrade resource.
+        mine_types = batch.mines[:, :, 0].astype(np.int64)
+        gold = np.minimum(batch.mines[:, :, 3].astype(np.int64), MAX_GOLD_UPGRADES)
+        rare = np.minimum(np.sum(batch.mines[:, :, 4:10], axis=2).astype(np.int64), MAX_RARE_UPGRADES)
+        gains = UPGRADE_GAIN[mine_types, gold, rare] * rates[mine_types][:, :, None]
+        resources = np.arange(7)
+        costs = batch.mine_upgrades.reshape(batch_size, num_mines, 7, 11)[:, :, resources, 4+resources] * rates
+        upgrade_payback = np.where(gains > 0, costs / gains, np.inf)
+        payback[:, ACTION_OFFSETS[6]:] = upgrade_payback.transpose(0, 2, 1).reshape(batch_size, -1)
+
+        # A construction yard pays for itself through the mines of the tier it unlocks, once every reachable mine is owned.
+        # They are bought best first at rising prices, and the yard gets the payback of the best number of them bought together.
+        unowned = batch.mines[:, :, 2] == 0
+        reachable_left = np.any(unowned & (batch.mines[:, :, 1] <= batch.const[:, None]), axis=1)
+        next_tier = unowned & (batch.mines[:, :, 1] == batch.const[:, None] + 1)
+        rows = np.arange(batch_size)[:, None]
+        order = np.argsort(np.where(next_tier, -mine_gains, np.inf), axis=1, kind='stable')
+        tier_gains = np.where(next_tier, mine_gains, 0)[rows, order]
+        tier_food = food_mines[rows, order]
+        bought_before = np.cumsum(~tier_food, axis=1) - ~tier_food # Non food mines bought before each one, which raise its price.
+        price_index = np.minimum(batch.owned_mines[:, None] + bought_before, batch.mine_purchase_cost_vals.shape[1] - 1)
+        tier_costs = np.where(tier_food, Game.MINE_FOOD_PURCHASE_COST @ rates, batch.mine_purchase_cost_vals[rows, price_index]*rates[0])
+        bundle_gains = np.cumsum(tier_gains, axis=1)
+        bundle_paybacks = (batch.const_cost @ rates)[:, None] + np.cumsum(np.where(tier_gains > 0, tier_costs, 0), axis=1)
+        bundle_paybacks = np.where(bundle_gains > 0, bundle_paybacks / bundle_gains, np.inf)
+        payback[:, ACTION_OFFSETS[1]] = np.where(reachable_left, np.inf, np.min(bundle_paybacks, axis=1))
+    return payback
+
+
+def roi_policy(batch, rng=None, rates=ROI_RATES, eco_until=ROI_ECO_UNTIL):
+    """
+    Batched greedy policy. Per row: the legal action with the shortest payback, if it pays back before the game ends and the round is before eco_until. Otherwise the legal unit action with the best score per cost. Otherwise the next round.
+    """
+    legal = batch.legal_mask()
+    rounds_left = Game.FINAL_ROUND - batch.round
+    payback = np.where(legal, action_paybacks(batch, rates), np.inf)
+    invest = np.argmin(payback, axis=1)
+    pays_back = (payback[np.arange(batch.batch_size), invest] < rounds_left) & (batch.round < eco_until)
+
+    values = np.where(legal, unit_values(batch, rates), 0)
+    unit = np.argmax(values, axis=1) # All zero picks action 0, next round.
+    return np.where(pays_back, invest, unit)
+
+
+def game_policy(game, rng=None, rates=ROI_RATES):
+    """
+    roi_policy for a single mnm2.Game, for simulate.
+    """
+    return int(roi_policy(single_row(game), rng, rates)[0])
+
+
+def format_tables(rates=ROI_RATES):
+    send_payback = send_paybacks(Game.sends, rates)
+    upgrade_payback = upgrade_paybacks(rates)
+    lines = ['Send paybacks (rounds):']
+    for send_id, name in enumerate(Game.SEND_NAMES):
+        lines.append(f"  {name:16} unlocks round {int(Game.sends[send_id, 0]):2}: {send_payback[send_id]:5.1f}")
+    lines.append('Mine upgrade paybacks (rounds) without rare upgrades, by gold upgrades done:')
+    for mine_type, name in enumerate(Game.RESOURCE_NAMES):
+        gold_paybacks = ' '.join(f'{payback:5.1f}' for payback in upgrade_payback[mine_type, :, 0, 0])
+        rare_paybacks = ' '.join(f'{payback:5.1f}' for payback in upgrade_payback[mine_type, 0, 0, 1:])
+        lines.append(f"  {name:8} gold: {gold_paybacks} | first rare (food..subdolak): {rare_paybacks}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Print ROI tables and benchmark the batched ROI greedy policy.')
+    parser.add_argument('--games', type=int, default=1024)
+    parser.add_argument('--rates', type=float, nargs=7, default=ROI_RATES.tolist(), help='Gold value of each resource.')
+    args = parser.parse_args(argv)
+    rates = np.array(args.rates)
+
+    print(format_tables(rates))
+    batch = BatchGame(args.games)
+    start = time.perf_counter()
+    play_batch(batch, lambda batch, rng: roi_policy(batch, rng, rates))
+    elapsed = time.perf_counter() - start
+    scores = batch.get_score()
+    print(f"{args.games} games in {elapsed:.2f}s ({args.games / elapsed:.0f} games/sec, {batch.num_steps} steps). "
+          f"Score mean {scores.mean():g}, max {scores.max():g}. Mean final income +{np.round(batch.income.mean(axis=0), 1)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
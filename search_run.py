@@ -0,0 +1,247 @@
+"""
+Long-running strategy searches over mnm2.Game with checkpoint/resume and live metrics.
+
+SearchRun is the framework: a subclass does its work in iterate(), one small deterministic step at a time, and keeps all of its state (including self.rng) as plain picklable attributes. run() then
+- checkpoints every checkpoint_every seconds, on SIGTERM/Ctrl-C and at the end, by writing a temp file and renaming it over the old checkpoint, so a killed run never leaves a torn checkpoint;
+- appends a line of live metrics (nodes, rollouts and their rates, best get_score, table sizes, RSS) to a JSON lines file every metrics_every seconds.
+Checkpoints are taken between iterations, so a resumed run continues bit-identically to one that was never stopped.
+
+TrajectorySearch is the search shipped with it: an elite pool of trajectories, mutated by replaying a random prefix of one and finishing the game with an epsilon-greedy rollout.
+
+python search_run.py --seed 1 --checkpoint run.ckpt --metrics run.jsonl --max-seconds 36000
+python search_run.py --resume run.ckpt --metrics run.jsonl --max-seconds 36000
+"""
+
+import abc
+import argparse
+import json
+import os
+import pickle
+import resource
+import signal
+import sys
+import time
+
+import numpy as np
+
+from mnm2 import Game
+import simulate
+
+
+def rss_bytes():
+    """
+    Current resident set size of this process (peak RSS where /proc is not available).
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        scale = 1 if sys.platform == 'darwin' else 1024 # ru_maxrss is in bytes on macOS, KiB elsewhere.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def atomic_write(path, data):
+    """
+    Writes bytes to path through a temp file and a rename, so readers see either the old or the new file.
+    """
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class SearchRun(abc.ABC):
+    """
+    Base class for resumable searches. Subclasses implement iterate() and may override table_sizes().
+    iterate() must only depend on the object's state and self.rng, and should bump self.nodes, self.rollouts and self.best_score.
+    """
+    def __init__(self, seed=0):
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        self.iterations = 0
+        self.nodes = 0 # Game actions performed.
+        self.rollouts = 0 # Games played to the end.
+        self.best_score = -np.inf
+        self.elapsed = 0.0 # Seconds of search over all sessions.
+
+    @abc.abstractmethod
+    def iterate(self):
+        """
+        One step of the search.
+        """
+
+    def table_sizes(self):
+        return {}
+
+    # Checkpoints
+    def save_checkpoint(self, path):
+        atomic_write(path, pickle.dumps(self, protocol=pickle.HIGHEST_PROTOCOL))
+
+    @staticmethod
+    def load_checkpoint(path):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    # Metrics
+    def metrics(self, since=None):
+        """
+        Returns a dict of counters. since is an earlier metrics() dict to compute rates from.
+        """
+        metrics = {
+            'time': time.time(),
+            'elapsed': round(self.elapsed, 3),
+            'iterations': self.iterations,
+            'nodes': self.nodes,
+            'rollouts': self.rollouts,
+            'best_score': None if self.best_score == -np.inf else float(self.best_score),
+            'tables': self.table_sizes(),
+            'rss_bytes': rss_bytes(),
+        }
+        if since is not None:
+            seconds = max(metrics['elapsed'] - since['elapsed'], 1e-9)
+            metrics['nodes_per_sec'] = round((self.nodes - since['nodes']) / seconds, 1)
+            metrics['rollouts_per_sec'] = round((self.rollouts - since['rollouts']) / seconds, 2)
+        return metrics
+
+    def run(self, max_iterations=None, max_seconds=None, checkpoint_path=None, checkpoint_every=60.0,
+            metrics_path=None, metrics_every=5.0, out=sys.stdout):
+        """
+        Iterates until max_iterations (in total, over all sessions) or max_seconds (this session) is reached, or SIGTERM/Ctrl-C.
+        """
+        # Signals only ask the loop to stop, so an iteration is never cut short halfway through.
+        stop = []
+        previous_handlers = {signum: signal.signal(signum, lambda signum, frame: stop.append(signum)) for signum in (signal.SIGTERM, signal.SIGINT)}
+        start = last_checkpoint = last_metrics = time.monotonic()
+        session_start_elapsed = self.elapsed
+        last = self.metrics()
+        try:
+            while not stop:
+                if max_iterations is not None and self.iterations >= max_iterations:
+                    break
+                if max_seconds is not None and time.monotonic() - start >= max_seconds:
+                    break
+                self.iterate()
+                self.iterations += 1
+                now = time.monotonic()
+                self.elapsed = session_start_elapsed + now - start
+                if metrics_path and now - last_metrics >= metrics_every:
+                    last = self.export_metrics(metrics_path, last, out)
+                    last_metrics = now
+                if checkpoint_path and now - last_checkpoint >= checkpoint_every:
+                    self.save_checkpoint(checkpoint_path)
+                    last_checkpoint = now
+        finally:
+            for signum, handler in previous_handlers.items():
+                signal.signal(signum, handler)
+            if checkpoint_path:
+                self.save_checkpoint(checkpoint_path)
+            if metrics_path:
+                self.export_metrics(metrics_path, last, out)
+        return self
+
+    def export_metrics(self, path, since, out=None):
+        metrics = self.metrics(since)
+        with open(path, 'a') as f:
+            f.write(json.dumps(metrics) + '\n')
+        if out is not None:
+            print(f"{metrics['iterations']} iterations, {metrics.get('nodes_per_sec', 0):g} nodes/sec, {metrics.get('rollouts_per_sec', 0):g} rollouts/sec, "
+                  f"best score {metrics['best_score']}, tables {metrics['tables']}, RSS {metrics['rss_bytes'] / 2**20:.0f} MiB", file=out, flush=True)
+        return metrics
+
+
+MAX_SEEN = 1_000_000 # Default cap on TrajectorySearch.seen, about 70 MB.
+
+
+class TrajectorySearch(SearchRun):
+    """
+    Keeps the elite_size best trajectories (action int lists). Each iteration picks an elite trajectory, replays a random prefix of it and finishes the game with epsilon-greedy moves. Results better than the worst elite replace it.
+    Duplicates are skipped through a set of trajectory hashes, about 70 bytes each. Once it holds max_seen hashes it is cleared down to the elite's, so memory stays bounded over long runs and older trajectories may be evaluated again.
+    """
+    def __init__(self, seed=0, elite_size=16, epsilon=0.05, max_seen=MAX_SEEN):
+        super().__init__(seed)
+        self.elite_size = elite_size
+        self.epsilon = epsilon
+        self.max_seen = max_seen
+        self.elite = [] # (score, tie_break, actions), best first.
+        self.seen = set() # Hashes of the trajectories evaluated since the last clear, to skip duplicates.
+
+    def __setstate__(self, state):
+        state.setdefault('max_seen', MAX_SEEN) # Checkpoints from before the cap.
+        self.__dict__.update(state)
+
+    def table_sizes(self):
+        return {'elite': len(self.elite), 'seen': len(self.seen)}
+
+    def policy(self, game, rng):
+        if rng.random() < self.epsilon:
+            return simulate.random_policy(game, rng)
+        return simulate.greedy_policy(game, rng)
+
+    def iterate(self):
+        game = Game(Game.mines, Game.mine_upgrades, Game.sends, Game.units)
+        actions = []
+        if self.elite:
+            parent = self.elite[self.rng.integers(len(self.elite))][2]
+            actions = parent[:self.rng.integers(len(parent) + 1)]
+            for action in actions:
+                game.perform_action(action)
+            game.actions_available = game.get_available_actions()
+            actions = list(actions)
+        actions += simulate.play_game(game, self.policy, self.rng)
+        self.nodes += len(actions)
+        self.rollouts += 1
+
+        trajectory_hash = hash(tuple(actions))
+        if trajectory_hash in self.seen:
+            return
+        if len(self.seen) >= self.max_seen:
+            self.seen = {hash(tuple(entry[2])) for entry in self.elite} # Elite trajectories must never be added twice.
+        self.seen.add(trajectory_hash)
+        score = float(game.get_score())
+        tie_break = float(simulate.GREEDY_RATES @ game.bank) # Prefer trajectories that leave more unspent.
+        if len(self.elite) < self.elite_size or (score, tie_break) > self.elite[-1][:2]:
+            self.elite.append((score, tie_break, actions))
+            self.elite.sort(key=lambda entry: (-entry[0], -entry[1]))
+            del self.elite[self.elite_size:]
+        self.best_score = max(self.best_score, score)
+
+    def best_actions(self):
+        return self.elite[0][2] if self.elite else []
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run or resume a checkpointed Mines and Magic strategy search.')
+    parser.add_argument('--resume', metavar='CHECKPOINT', help='Continue the search saved in this checkpoint.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--elite-size', type=int, default=16)
+    parser.add_argument('--epsilon', type=float, default=0.05)
+    parser.add_argument('--max-seen', type=int, default=MAX_SEEN, help='Trajectory hashes kept for duplicate checks, about 70 MB per million.')
+    parser.add_argument('--checkpoint', help='Checkpoint path (defaults to the --resume path).')
+    parser.add_argument('--checkpoint-every', type=float, default=60.0, help='Seconds between checkpoints.')
+    parser.add_argument('--metrics', help='JSON lines file to append live metrics to.')
+    parser.add_argument('--metrics-every', type=float, default=5.0, help='Seconds between metrics lines.')
+    parser.add_argument('--max-iterations', type=int)
+    parser.add_argument('--max-seconds', type=float)
+    parser.add_argument('--dump', help='Write the best trajectory here when done, in the format simulate --policy file reads.')
+    args = parser.parse_args(argv)
+
+    if args.resume:
+        search = SearchRun.load_checkpoint(args.resume)
+        print(f"Resumed at iteration {search.iterations}, best score {search.best_score}")
+    else:
+        search = TrajectorySearch(args.seed, args.elite_size, args.epsilon, args.max_seen)
+    search.run(args.max_iterations, args.max_seconds, args.checkpoint or args.resume, args.checkpoint_every,
+               args.metrics, args.metrics_every)
+    print(f"Stopped at iteration {search.iterations}, best score {search.best_score}")
+    if args.dump:
+        with open(args.dump, 'w') as f:
+            f.write(f"# score {search.best_score:g}, search seed {search.seed}, iteration {search.iterations}\n")
+            f.write(' '.join(str(action) for action in search.best_actions()) + '\n')
+    return 0
+
+
+if __name__ == "__main__":
+    import search_run # Run from the module so checkpoints pickle search_run classes, not __main__ ones.
+    sys.exit(search_run.main())
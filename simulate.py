@@ -0,0 +1,346 @@
+"""
+Headless batch simulation of mnm2.Game.
+
+Plays many games without the interactive prompt, spreads them over a process pool and streams summary statistics (final bank, income, get_score distribution and games/sec). Used for strategy sweeps:
+
+python mnm2.py simulate --policy greedy --games 10000 --workers 8 --seed 1 --dump-best 5 --dump-dir best/
+
+A policy is any callable policy(game, rng) that returns one of game.actions_available. Trajectories dumped with --dump-best can be replayed with --policy file --policy-file best/best_0.txt. Trajectories from --random-maps runs record the seed of their map, and the replay rebuilds that map.
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import mapgen
+from mnm2 import Game
+import roi
+
+
+### Policies
+def random_policy(game, rng):
+    """
+    Picks uniformly among the available actions.
+    """
+    return game.actions_available[rng.integers(len(game.actions_available))]
+
+
+# Gold value of one unit of each resource, used by the greedy policy to compare incomes and costs.
+GREEDY_RATES = np.array((1, 3, 3, 1, 3, 3, 3), dtype=np.float32)
+GREEDY_ECO_UNTIL = 30 # Round at which the greedy policy stops investing and starts buying units.
+
+
+def action_gain(game, action_tuple):
+    """
+    Returns (income_delta, cost) of an economy action without performing it. Both are length 7 resource vectors.
+    """
+    action_type, args = action_tuple
+    income_delta = np.zeros(7, dtype=np.float32)
+    if action_type == 1: # Construction yard: no income of its own.
+        return income_delta, game.const_cost.astype(np.float32)
+    if action_type == 4: # Send
+        income_delta[0] = game.sends[args[0], 1]
+        return income_delta, game.sends[args[0], 2:]
+    if action_type == 5: # Mine purchase
+        mine_id = args[0]
+        if game.mines[mine_id, 0] == Game.FOOD:
+            cost = Game.MINE_FOOD_PURCHASE_COST.astype(np.float32)
+        else:
+            cost = game.mine_purchase_cost
+        return game.mines[mine_id, 10:].copy(), cost
+    if action_type == 6: # Mine upgrade, same income formula as Game.upgrade_mine.
+        mine_id, res_id = args
+        mine = game.mines[mine_id]
+        mine_type = int(mine[0])
+        upgrades = mine[3:10].copy()
+        upgrades[res_id] += 1
+        new_income = np.round((Game.MINE_BASE_INCOMES[mine_type, mine_type] + upgrades[0]) * (1 + 0.2*np.sum(upgrades[1:])), 1)
+        income_delta[mine_type] = new_income - mine[10+mine_type]
+        return income_delta, game.mine_upgrades[7*mine_id+res_id, 4:11]
+    raise ValueError(f"Action type {action_type} is not an economy action")
+
+
+def unit_gain(game, action_tuple):
+    """
+    Returns (score_delta, cost) of a unit purchase or upgrade.
+    """
+    action_type, (unit_id,) = action_tuple
+    unit = game.units[unit_id]
+    if action_type == 2:
+        cost = unit[9:16].copy()
+        if np.sum(unit[:2]) == 0: # Needs research
+            cost += unit[2:9]
+        return 1, cost
+    return 9, unit[16:] # Upgrading swaps a 1 point unit for a 10 point unit.
+
+
+def greedy_policy(game, rng, rates=GREEDY_RATES, eco_until=GREEDY_ECO_UNTIL):
+    """
+    Eco greedily, then spend on units.
+    Before round eco_until, takes the economy action with the best income per cost (valued at rates) as long as it pays back before the game ends. Construction yards are bought once every reachable mine is owned. Afterwards, takes the unit action with the best score per cost. Otherwise moves to the next round.
+    """
+    best_action, best_ratio = 0, 0
+    rounds_left = Game.FINAL_ROUND - game.round
+    for action in game.actions_available:
+        action_tuple = game.action_space[action]
+        action_type = action_tuple[0]
+        if game.round < eco_until:
+            if action_type in (0, 2, 3):
+                continue
+            if action_type == 1:
+                reachable = (game.mines[:, 1] <= game.const) & (game.mines[:, 2] == 0)
+                if not np.any(reachable):
+                    best_action = action
+                continue
+            income_delta, cost = action_gain(game, action_tuple)
+            gain = float(rates @ income_delta)
+            cost = float(rates @ cost)
+            if gain <= 0 or cost / gain >= rounds_left: # Never pays back.
+                continue
+            ratio = gain / cost
+        else:
+            if action_type not in (2, 3):
+                continue
+            score_delta, cost = unit_gain(game, action_tuple)
+            ratio = score_delta / max(float(rates @ cost), 1e-6)
+        if ratio > best_ratio:
+            best_action, best_ratio = action, ratio
+    return best_action
+
+
+def load_schedule(path):
+    """
+    Reads a schedule of action ints (whitespace or comma separated). Lines starting with # are comments.
+    """
+    actions = []
+    with open(path) as f:
+        for line in f:
+            line = line.split('#', 1)[0]
+            actions.extend(int(token) for token in line.replace(',', ' ').split())
+    return tuple(actions)
+
+
+MAP_SEED_PREFIX = '# map seed '
+
+
+def load_map_seed(path):
+    """
+    Returns the map seed a schedule file was recorded on, or None for the fixed map.
+    """
+    with open(path) as f:
+        for line in f:
+            if line.startswith(MAP_SEED_PREFIX):
+                return int(line[len(MAP_SEED_PREFIX):])
+    return None
+
+
+def make_game(rng, random_maps=False, map_seed=None):
+    """
+    A new game on the fixed map, on a map sampled from rng with random_maps, or on the map generated from map_seed.
+    """
+    if map_seed is not None:
+        rng = np.random.default_rng(map_seed)
+    elif not random_maps:
+        return Game(Game.mines, Game.mine_upgrades, Game.sends, Game.units)
+    _, mines, mine_upgrades = mapgen.generate_map(rng)
+    return mapgen.make_game(mines, mine_upgrades)
+
+
+class SchedulePolicy:
+    """
+    Replays a fixed schedule of action ints. Moves to the next round until the next scheduled action becomes available, and keeps moving to the next round once the schedule runs out.
+    """
+    def __init__(self, schedule):
+        self.schedule = schedule
+        self.position = 0
+
+    def __call__(self, game, rng):
+        if self.position < len(self.schedule):
+            action = self.schedule[self.position]
+            if action in game.actions_available:
+                self.position += 1
+                return action
+        return 0
+
+
+POLICIES = {
+    'random': random_policy,
+    'greedy': greedy_policy,
+    'roi': roi.game_policy,
+}
+
+
+_books = {} # Opening books loaded in this process, by path.
+
+
+def make_policy(name, schedule=None, book=None):
+    """
+    Returns a fresh policy by name. With a book path, book moves are played first while the game is in the book.
+    """
+    policy = SchedulePolicy(schedule) if name == 'file' else POLICIES[name]
+    if book is not None:
+        import opening_book
+        if book not in _books:
+            _books[book] = opening_book.OpeningBook.load(book)
+        policy = opening_book.BookPolicy(_books[book], policy)
+    return policy
+
+
+### Simulation
+def play_game(game, policy, rng):
+    """
+    Plays a game to the end with the given policy. Returns the list of action ints performed.
+    """
+    actions = []
+    while game.round < Game.FINAL_ROUND:
+        action = policy(game, rng)
+        game.perform_action(action)
+        actions.append(action)
+        game.actions_available = game.get_available_actions()
+    return actions
+
+
+def run_game(task):
+    """
+    Worker entry point. Plays one game and returns (game_index, score, bank, income, actions).
+    """
+    game_index, seed, policy_name, schedule, random_maps, map_seed, book = task
+    rng = np.random.default_rng(seed)
+    game = make_game(rng, random_maps, map_seed)
+    actions = play_game(game, make_policy(policy_name, schedule, book), rng)
+    return game_index, float(game.get_score()), game.bank.copy(), game.income.copy(), actions
+
+
+class Summary:
+    """
+    Running statistics over finished games. Keeps the top trajectories by score.
+    """
+    def __init__(self, keep_best=0):
+        self.scores = []
+        self.bank_total = np.zeros(7, dtype=np.float64)
+        self.income_total = np.zeros(7, dtype=np.float64)
+        self.keep_best = keep_best
+        self.best = [] # (score, game_index, actions), sorted best first.
+
+    def add(self, game_index, score, bank, income, actions):
+        self.scores.append(score)
+        self.bank_total += bank
+        self.income_total += income
+        if self.keep_best:
+            self.best.append((score, game_index, actions))
+            self.best.sort(key=lambda entry: (-entry[0], entry[1]))
+            del self.best[self.keep_best:]
+
+    def line(self, elapsed):
+        scores = np.array(self.scores)
+        games = len(scores)
+        return (f"{games} games, {games / max(elapsed, 1e-9):.1f} games/sec. "
+                f"Score mean {scores.mean():.2f} min {scores.min():.0f} max {scores.max():.0f}. "
+                f"Mean gold bank {self.bank_total[0] / games:.1f}, income +{self.income_total[0] / games:.1f}")
+
+    def report(self, elapsed):
+        scores = np.array(self.scores)
+        games = len(scores)
+        p10, p50, p90 = np.percentile(scores, (10, 50, 90))
+        lines = [
+            self.line(elapsed),
+            f"Score std {scores.std():.2f}, p10 {p10:.1f}, p50 {p50:.1f}, p90 {p90:.1f}",
+            f"Mean final bank: {np.round(self.bank_total / games, 1)}",
+            f"Mean final income: +{np.round(self.income_total / games, 1)}",
+        ]
+        values, counts = np.unique(scores, return_counts=True)
+        if len(values) <= 20:
+            lines.append("Score distribution: " + ", ".join(f"{value:g}: {count}" for value, count in zip(values, counts)))
+        else:
+            counts, edges = np.histogram(scores, bins=10)
+            lines.append("Score distribution: " + ", ".join(f"[{low:g}, {high:g}): {count}" for low, high, count in zip(edges[:-1], edges[1:], counts)))
+        return '\n'.join(lines)
+
+
+def dump_best(summary, dump_dir, seeds, random_maps=False):
+    """
+    Writes each kept trajectory to dump_dir/best_<rank>.txt in the format read by load_schedule.
+    With random_maps, the game's seed is also written as its map seed, since the map was the first thing sampled from it.
+    """
+    os.makedirs(dump_dir, exist_ok=True)
+    for rank, (score, game_index, actions) in enumerate(summary.best):
+        with open(os.path.join(dump_dir, f'best_{rank}.txt'), 'w') as f:
+            f.write(f"# score {score:g}, game {game_index}, seed {seeds[game_index]}\n")
+            if random_maps:
+                f.write(f"{MAP_SEED_PREFIX}{seeds[game_index]}\n")
+            f.write(' '.join(str(action) for action in actions) + '\n')
+
+
+def simulate(policy, games, workers=1, seed=0, schedule=None, keep_best=0, report_every=0, random_maps=False, book=None, out=sys.stdout, map_seed=None):
+    """
+    Plays games with the named policy, optionally in a process pool, and returns (Summary, per-game seeds).
+    With random_maps each game is played on a map sampled from its seed, with map_seed every game is played on the map generated from it. book is the path of an opening book to play from.
+    Prints a progress line every report_every games.
+    """
+    seeds = [int(s.generate_state(1)[0]) for s in np.random.SeedSequence(seed).spawn(games)]
+    tasks = [(game_index, seeds[game_index], policy, schedule, random_maps, map_seed, book) for game_index in range(games)]
+    summary = Summary(keep_best)
+    start = time.perf_counter()
+
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        results = executor.map(run_game, tasks, chunksize=max(1, min(64, games // (4*workers))))
+    else:
+        executor = None
+        results = map(run_game, tasks)
+    try:
+        for result in results:
+            summary.add(*result)
+            if report_every and len(summary.scores) % report_every == 0:
+                print(summary.line(time.perf_counter() - start), file=out, flush=True)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return summary, seeds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='mnm2.py simulate', description='Run headless Mines and Magic economy simulations.')
+    parser.add_argument('--policy', choices=sorted(POLICIES) + ['file'], default='greedy')
+    parser.add_argument('--policy-file', help='Schedule of action ints for --policy file.')
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--book', help='Opening book (see opening_book.py) to play from before handing over to the policy.')
+    parser.add_argument('--random-maps', action='store_true', help='Play each game on a randomly generated map.')
+    parser.add_argument('--map-seed', type=int, help='Play every game on the map generated from this seed. Defaults to the map seed recorded in --policy-file.')
+    parser.add_argument('--report-every', type=int, default=0, help='Print running stats every N games (default: about 10 times per run).')
+    parser.add_argument('--dump-best', type=int, default=0, help='Number of best trajectories to write out.')
+    parser.add_argument('--dump-dir', default='best_trajectories')
+    args = parser.parse_args(argv)
+
+    if args.games < 1:
+        parser.error('--games must be at least 1')
+
+    schedule = None
+    if args.policy == 'file':
+        if not args.policy_file:
+            parser.error('--policy file requires --policy-file')
+        schedule = load_schedule(args.policy_file)
+        if args.map_seed is None:
+            args.map_seed = load_map_seed(args.policy_file)
+    if args.random_maps and args.map_seed is not None:
+        parser.error('--random-maps and a map seed exclude each other')
+
+    start = time.perf_counter()
+    summary, seeds = simulate(args.policy, args.games, args.workers, args.seed, schedule,
+                              keep_best=args.dump_best, report_every=args.report_every or max(1, args.games // 10),
+                              random_maps=args.random_maps, book=args.book, map_seed=args.map_seed)
+    print(summary.report(time.perf_counter() - start))
+    if args.dump_best:
+        dump_best(summary, args.dump_dir, seeds, args.random_maps)
+        print(f"Wrote {len(summary.best)} trajectories to {args.dump_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
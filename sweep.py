@@ -0,0 +1,93 @@
+"""
+Vectorized sweeps over the game's balance constants.
+
+Several numbers in the model are uncertain (the sends marked # ? in mnm.SENDS, the unit costs in Game.UNIT_NAMES, ...). sweep() plays one fixed schedule or batched policy under many alternative values at once, with the variant as the batch axis of a BatchGame, instead of editing Game's class constants and re-importing for each variant:
+
+schedule = simulate.load_schedule('best/best_0.txt')
+variants = product_variants(
+    send_configs=vary(Game.SEND_CONFIG, (6, 1), [1.0, 1.5, 2.0]), # Mechanical Ling income
+    mine_purchase_cost_vals=vary(Game.MINE_PURCHASE_COST_VALS, 5, [26, 27]),
+)
+results = sweep(schedule=schedule, **variants)
+"""
+
+import itertools
+
+import numpy as np
+
+from batch import BatchGame, BatchSchedulePolicy, play_batch
+
+
+# sweep() keyword -> BatchGame keyword
+SWEEP_PARAMETERS = {
+    'send_configs': 'sends',
+    'unit_configs': 'units',
+    'mine_purchase_cost_vals': 'mine_purchase_cost_vals',
+    'gold_upgrade_costs_mana': 'gold_upgrade_costs_mana',
+    'gold_upgrade_costs_default': 'gold_upgrade_costs_default',
+}
+
+
+def vary(table, index, values):
+    """
+    Returns len(values) copies of table stacked on a new leading axis, with table[index] set to each of the values.
+    """
+    table = np.asarray(table, dtype=np.float64)
+    variants = np.repeat(table[None], len(values), axis=0)
+    for variant, value in zip(variants, values):
+        variant[index] = value
+    return variants
+
+
+def product_variants(**options):
+    """
+    Takes a stack of alternatives per sweep parameter and returns the stacks for every combination of them, so they can be passed to sweep().
+    """
+    names = list(options)
+    combos = list(itertools.product(*(range(len(options[name])) for name in names)))
+    return {name: np.stack([np.asarray(options[name])[combo[i]] for combo in combos]) for i, name in enumerate(names)}
+
+
+def sweep(schedule=None, policy=None, seed=0, **variants):
+    """
+    Plays every variant to the end of the game in one batch and returns a dict of per-variant arrays:
+    score, bank, income, and (for a schedule) schedule_position, how many scheduled actions were performed.
+
+    variants are any of SWEEP_PARAMETERS, each with a leading variant axis, and all with the same number of variants. Other BatchGame tables (mines, mine_upgrades) may also be passed, with or without the variant axis.
+    Pass either a schedule of action ints (replayed like simulate's file policy) or a batched policy(batch, rng).
+    """
+    if (schedule is None) == (policy is None):
+        raise ValueError("Pass exactly one of schedule or policy")
+    sizes = {len(values) for name, values in variants.items() if name in SWEEP_PARAMETERS}
+    if len(sizes) > 1:
+        raise ValueError(f"All swept parameters need the same number of variants, got {sorted(sizes)}")
+    num_variants = sizes.pop() if sizes else 1
+
+    batch = BatchGame(num_variants, **{SWEEP_PARAMETERS.get(name, name): values for name, values in variants.items()})
+    if schedule is not None:
+        policy = BatchSchedulePolicy(schedule, num_variants)
+    play_batch(batch, policy, seed)
+
+    results = {
+        'score': batch.get_score(),
+        'bank': batch.bank,
+        'income': batch.income,
+    }
+    if schedule is not None:
+        policy.sync(batch)
+        results['schedule_position'] = policy.position
+    return results
+
+
+def format_results(results, top=None):
+    """
+    Formats sweep results one line per variant, best score first.
+    """
+    order = np.argsort(-results['score'], kind='stable')[:top]
+    lines = []
+    for variant in order:
+        line = f"Variant {variant}: score {results['score'][variant]:g}, bank {np.round(results['bank'][variant], 1)}, income +{np.round(results['income'][variant], 1)}"
+        if 'schedule_position' in results:
+            line += f", {results['schedule_position'][variant]} scheduled actions performed"
+        lines.append(line)
+    return '\n'.join(lines)
@@ -0,0 +1,106 @@
+"""
+4v4 team economy simulation.
+
+Mines and Magic is played 4v4. Match simulates every player of one or many matches as rows of a single BatchGame. Rounds progress together: a player that moves to the next round waits until every player in its match has done the same. Team score is the sum of its players' get_score.
+
+Players are independent. The engine has no waves, kill bounties or early army (every unit needs rare resources and only counts for the final fight), so nothing an ally does changes a player's game, and the lockstep changes no result. A team's score is exactly the sum of the games its players would play alone, so spending on army earlier, as make_killer_policy does, can only lower it. Match is a harness for comparing team mixes under the same seeds, and for policies that read their allies' rows; it does not model an eco player relying on allies to kill its waves.
+
+killer = make_killer_policy(fallback=roi_policy)
+match = Match([[roi_policy, roi_policy, killer, killer], [roi_policy, roi_policy, roi_policy, killer]], num_matches=100)
+match.play(seed=1)
+print(match.team_scores().mean(axis=0))
+"""
+
+import numpy as np
+
+from batch import BatchGame
+from mnm2 import Game
+from roi import ROI_RATES, unit_values
+
+
+def make_killer_policy(fallback=None, rates=ROI_RATES):
+    """
+    Returns a batched policy for a player that spends on army first: it takes the legal unit action with the best score per cost (valued at rates). Rows with no unit action play the fallback policy, or move to the next round without one.
+    """
+    def killer_policy(batch, rng):
+        values = np.where(batch.legal_mask(), unit_values(batch, rates), 0)
+        actions = np.argmax(values, axis=1) # All zero picks action 0, next round.
+        if fallback is not None:
+            actions = np.where(np.any(values > 0, axis=1), actions, fallback(batch, rng))
+        return actions
+    return killer_policy
+
+
+killer_policy = make_killer_policy()
+
+
+class Match:
+    """
+    num_matches matches between teams of players. teams is a list with one list of batched policies per team, one policy per player, and every team has the same size.
+    Player (match m, team t, slot p) is row (m*num_teams + t)*team_size + p of self.players. Policies are called on the whole batch and only their own rows' actions are used.
+    """
+    def __init__(self, teams, num_matches=1, **tables):
+        self.num_teams = len(teams)
+        self.team_size = len(teams[0])
+        if any(len(team) != self.team_size for team in teams):
+            raise ValueError("All teams need the same number of players")
+        self.num_matches = num_matches
+        self.players_per_match = self.num_teams*self.team_size
+        self.players = BatchGame(num_matches*self.players_per_match, **tables)
+
+        # Which rows each distinct policy plays.
+        slots = [policy for team in teams for policy in team]
+        row_slots = np.tile(np.arange(self.players_per_match), num_matches)
+        self.policies = []
+        for policy in dict.fromkeys(slots): # Distinct policies, in order.
+            slot_ids = [slot for slot, slot_policy in enumerate(slots) if slot_policy is policy]
+            self.policies.append((policy, np.isin(row_slots, slot_ids)))
+
+    def match_round(self):
+        """
+        Returns each match's current round, the round its slowest player is on.
+        """
+        return self.players.round.reshape(self.num_matches, self.players_per_match).min(axis=1)
+
+    def done(self):
+        return self.match_round() >= Game.FINAL_ROUND
+
+    def step(self, actions):
+        """
+        Performs one action per player. Players that are ahead of their match's round wait.
+        """
+        match_round = np.repeat(self.match_round(), self.players_per_match)
+        waiting = (self.players.round > match_round) | (match_round >= Game.FINAL_ROUND)
+        self.players.step(np.where(waiting, -1, actions))
+
+    def play(self, seed=None):
+        """
+        Plays all matches to the end of the game.
+        """
+        rng = np.random.default_rng(seed)
+        while not np.all(self.done()):
+            actions = np.zeros(self.players.batch_size, dtype=np.int64)
+            for policy, rows in self.policies:
+                actions[rows] = np.asarray(policy(self.players, rng))[rows]
+            self.step(actions)
+        return self
+
+    def player_scores(self):
+        """
+        Returns get_score per player, shape (num_matches, num_teams, team_size).
+        """
+        return self.players.get_score().reshape(self.num_matches, self.num_teams, self.team_size)
+
+    def team_scores(self):
+        """
+        Returns each team's combined score, shape (num_matches, num_teams).
+        """
+        return self.player_scores().sum(axis=2)
+
+    def winners(self):
+        """
+        Returns the index of the highest scoring team of each match, or -1 for a tie.
+        """
+        scores = self.team_scores()
+        best = scores.max(axis=1, keepdims=True)
+        return np.where(np.sum(scores == best, axis=1) > 1, -1, np.argmax(scores, axis=1))
@@ -0,0 +1,61 @@
+import numpy as np
+
+from batch import BatchGame
+from mnm2 import Game
+import mapgen
+import simulate
+
+
+def test_batch_game_matches_game_on_random_maps():
+    """
+    Plays random and greedy games on several generated maps in a Game per map and in one BatchGame, comparing legal actions and state after every step.
+    """
+    num_maps = 6
+    rng = np.random.default_rng(0)
+    _, mines, mine_upgrades = mapgen.sample_maps(num_maps, seed=3)
+    games = [mapgen.make_game(mines[row], mine_upgrades[row]) for row in range(num_maps)]
+    batch = BatchGame(num_maps, mines, mine_upgrades)
+    while not all(game.round >= Game.FINAL_ROUND for game in games):
+        mask = batch.legal_mask()
+        actions = np.full(num_maps, -1)
+        for row, game in enumerate(games):
+            if game.round >= Game.FINAL_ROUND:
+                continue
+            assert sorted(game.actions_available) == list(np.nonzero(mask[row])[0])
+            policy = simulate.greedy_policy if row % 2 else simulate.random_policy
+            actions[row] = policy(game, rng)
+            game.perform_action(actions[row])
+            game.actions_available = game.get_available_actions()
+        batch.step(actions)
+        for row, game in enumerate(games):
+            assert np.array_equal(game.bank, batch.bank[row])
+            assert np.array_equal(game.income, batch.income[row])
+            assert np.array_equal(game.mines, batch.mines[row])
+            assert np.array_equal(game.mine_upgrades, batch.mine_upgrades[row])
+            assert np.array_equal(game.units, batch.units[row])
+    assert np.array_equal(batch.get_score(), [game.get_score() for game in games])
+
+
+def test_shared_tables_are_not_copied_per_row():
+    batch = BatchGame(8)
+    assert batch.initial_mine_upgrades.ndim == 2
+    assert batch.take([0, 0, 3]).initial_mine_upgrades is batch.initial_mine_upgrades
+
+
+def test_concatenate_mixes_shared_and_per_row_tables():
+    _, mines, mine_upgrades = mapgen.sample_maps(2, seed=1)
+    batch = BatchGame.concatenate([BatchGame(3), BatchGame(2, mines, mine_upgrades)])
+    batch.reset()
+    assert batch.batch_size == 5
+    assert np.array_equal(batch.mines[0], Game.mines)
+    assert np.array_equal(batch.mines[4], mines[1])
+
+
+def test_legal_mask_of_selected_rows():
+    batch = BatchGame(16)
+    rng = np.random.default_rng(1)
+    rows = np.array([11, 2, 7])
+    for _ in range(200):
+        mask = batch.legal_mask()
+        assert np.array_equal(batch.legal_mask(rows), mask[rows])
+        batch.step(np.where(batch.done(), -1, np.argmax(np.where(mask, rng.random(mask.shape), -1), axis=1)))
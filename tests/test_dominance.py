@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from batch import ACTION_ARG0, ACTION_ARG1, ACTION_OFFSETS, ACTION_TYPES, BatchGame, play_batch
+import dominance
+from mnm2 import Game
+
+
+def test_dominated_sends_have_a_cheaper_replacement():
+    sends = Game.sends
+    for round_, send_id in zip(*np.nonzero(dominance.SEND_DOMINATED)):
+        replacements = [(other, copies) for other in range(len(sends)) for copies in range(1, dominance.MAX_COPIES + 1)
+                        if other != send_id and sends[other, 0] <= round_ and np.all(copies*sends[other, 2:] <= sends[send_id, 2:])
+                        and copies*sends[other, 1] >= sends[send_id, 1]]
+        assert replacements, (round_, send_id)
+
+
+def test_dominated_self_financed_upgrades_never_pay_back():
+    """
+    Plays random games, and wherever a legal gold upgrade of a gold mine or rare upgrade with the mine's own resource is masked, checks that taking it and then only moving to the next round never ends with more of any resource than not taking it.
+    """
+    batch = BatchGame(64)
+    rng = np.random.default_rng(0)
+    upgrades = np.arange(ACTION_OFFSETS[6], len(ACTION_TYPES))
+    checked = 0
+    while not np.all(batch.done()):
+        legal = batch.legal_mask()
+        if batch.num_steps % 10 == 0:
+            mine_types = batch.mines[np.arange(batch.batch_size)[:, None], ACTION_ARG0[upgrades], 0]
+            self_financed = mine_types == ACTION_ARG1[upgrades]
+            pruned = legal[:, upgrades] & ~dominance.dominance_mask(batch)[:, upgrades] & self_financed & ~batch.done()[:, None]
+            rows, columns = np.nonzero(pruned)
+            if rows.size:
+                taken, skipped = batch.take(rows), batch.take(rows)
+                taken.step(upgrades[columns])
+                play_batch(taken, lambda batch, rng: np.zeros(batch.batch_size, dtype=np.int64))
+                play_batch(skipped, lambda batch, rng: np.zeros(batch.batch_size, dtype=np.int64))
+                assert np.all(taken.bank <= skipped.bank + 1e-3)
+                checked += rows.size
+        batch.step(np.where(batch.done(), -1, np.argmax(np.where(legal, rng.random(legal.shape), -1), axis=1)))
+    assert checked > 100, checked
+
+
+def test_swept_costs_are_refused():
+    sends = np.repeat(Game.sends[None], 2, axis=0)
+    sends[1, 0, 1] *= 2
+    with pytest.raises(ValueError):
+        dominance.dominance_mask(BatchGame(2, sends=sends))
+    with pytest.raises(ValueError):
+        dominance.dominance_mask(BatchGame(2, gold_upgrade_costs_default=np.array(Game.MINE_GOLD_UPGRADE_COSTS_DEFAULT) + 1))
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from batch import BatchGame, NUM_ACTIONS
+from env_server import EnvClient, EnvError, OP_STEP, STATE_SIZE, start_background_server
+
+
+CAPACITY = 8
+
+
+@pytest.fixture(scope='module')
+def server(tmp_path_factory):
+    return start_background_server(str(tmp_path_factory.mktemp('env') / 'env.sock'), CAPACITY)
+
+
+@pytest.fixture
+def client(server):
+    client = EnvClient(server.path)
+    yield client
+    client.close()
+
+
+def test_info(client):
+    assert (client.capacity, client.state_size, client.num_actions) == (CAPACITY, STATE_SIZE, NUM_ACTIONS)
+
+
+def test_reset_step_and_mask_match_batch_game(client):
+    ids = np.array([5, 1, 6])
+    local = BatchGame(len(ids))
+    states, rewards, done = client.reset(ids)
+    assert np.array_equal(states, local.get_state()) and not rewards.any() and not done.any()
+    rng = np.random.default_rng(0)
+    for _ in range(100):
+        mask = client.mask(ids)
+        assert np.array_equal(mask, local.legal_mask())
+        actions = np.argmax(np.where(mask, rng.random(mask.shape), -1), axis=1)
+        score = local.get_score()
+        local.step(actions)
+        states, rewards, done = client.step(ids, actions)
+        assert np.array_equal(states, local.get_state())
+        assert np.array_equal(rewards, local.get_score() - score)
+        assert np.array_equal(done, local.done())
+
+
+def test_errors_are_replies(client):
+    client.reset([0])
+    with pytest.raises(EnvError, match='below'):
+        client.mask([CAPACITY])
+    with pytest.raises(EnvError, match='distinct'):
+        client.reset([2, 2])
+    with pytest.raises(EnvError, match='Illegal'):
+        client.step([0], [NUM_ACTIONS - 1]) # An upgrade of a mine not owned yet.
+    with pytest.raises(EnvError, match='Unknown op'):
+        client._request(9)
+    assert client.mask([0]).shape == (1, NUM_ACTIONS)
+
+
+def test_empty_requests(client):
+    states, rewards, done = client.step([], [])
+    assert states.shape == (0, STATE_SIZE) and rewards.size == done.size == 0
+    assert client.mask([]).shape == (0, NUM_ACTIONS)
+    assert client.reset([])[0].shape == (0, STATE_SIZE)
+    assert client.mask([3]).shape == (1, NUM_ACTIONS)
+
+
+def test_unexpected_errors_keep_the_worker_alive(server, client, monkeypatch):
+    def broken(*args):
+        raise RuntimeError('broken')
+    monkeypatch.setattr(server, 'legal_mask', broken)
+    with pytest.raises(EnvError, match='Internal error'):
+        client.mask([0])
+    with pytest.raises(EnvError, match='Internal error'):
+        client._request(OP_STEP, [0], [0])
+    monkeypatch.undo()
+    assert client.mask([0]).shape == (1, NUM_ACTIONS)
@@ -0,0 +1,11 @@
+import io
+
+import leaf_eval
+
+
+def test_report_without_kept_states():
+    features, scores, kept = leaf_eval.generate_dataset(16)
+    assert kept is None and len(features) == len(scores)
+    out = io.StringIO()
+    leaf_eval.report([('ridge', leaf_eval.fit_ridge(features, scores))], num_games=16, rollout_states=0, out=out)
+    assert 'roi rollout' not in out.getvalue() and 'ridge' in out.getvalue()
@@ -0,0 +1,24 @@
+from mnm2 import Game
+
+
+def new_game():
+    return Game(Game.mines, Game.mine_upgrades, Game.sends, Game.units)
+
+
+def test_upgradable_units_are_unit_ids():
+    game = new_game()
+    game.bank[:] = 10000
+    game.units[2, 0] = 1 # Only the third unit has a base unit to upgrade.
+    assert game.get_upgradable_units() == ((3, (2,)),)
+
+
+def test_mine_purchase_charges_the_cost_shown():
+    game = new_game()
+    game.bank[0] = 1000
+    mine_ids = [mine_id for mine_id in range(len(game.mines)) if game.mines[mine_id, 0] != Game.FOOD and game.mines[mine_id, 1] <= game.const]
+    for purchase, mine_id in enumerate(mine_ids[:2]):
+        assert game.mine_purchase_cost[0] == Game.MINE_PURCHASE_COST_VALS[purchase]
+        bank = game.bank[0]
+        game.purchase_mine(mine_id)
+        assert bank - game.bank[0] == Game.MINE_PURCHASE_COST_VALS[purchase]
+    assert game.mine_purchase_cost[0] == Game.MINE_PURCHASE_COST_VALS[2]
@@ -0,0 +1,31 @@
+import pickle
+
+import pytest
+
+from search_run import MAX_SEEN, SearchRun, TrajectorySearch
+
+
+def state(search):
+    return (search.iterations, search.nodes, search.rollouts, search.best_score, search.elite, search.seen, search.rng.bit_generator.state)
+
+
+def test_resumed_run_is_bit_identical(tmp_path):
+    checkpoint = tmp_path / 'run.ckpt'
+    TrajectorySearch(seed=3).run(max_iterations=12, checkpoint_path=checkpoint, out=None)
+    resumed = SearchRun.load_checkpoint(checkpoint).run(max_iterations=30, out=None)
+    uninterrupted = TrajectorySearch(seed=3).run(max_iterations=30, out=None)
+    assert state(resumed) == state(uninterrupted)
+
+
+def test_seen_hashes_are_capped():
+    search = TrajectorySearch(seed=1, elite_size=4, max_seen=8).run(max_iterations=40, out=None)
+    assert len(search.seen) <= 8
+    assert len({tuple(entry[2]) for entry in search.elite}) == len(search.elite)
+    old = pickle.loads(pickle.dumps(search))
+    del old.__dict__['max_seen']
+    assert pickle.loads(pickle.dumps(old)).max_seen == MAX_SEEN
+
+
+def test_search_run_needs_iterate():
+    with pytest.raises(TypeError):
+        SearchRun()
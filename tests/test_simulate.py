@@ -0,0 +1,12 @@
+import io
+
+import simulate
+
+
+def test_random_map_trajectories_replay_on_their_map(tmp_path):
+    summary, seeds = simulate.simulate('greedy', 4, seed=2, keep_best=2, random_maps=True, out=io.StringIO())
+    simulate.dump_best(summary, tmp_path, seeds, random_maps=True)
+    for rank, (score, _, _) in enumerate(summary.best):
+        path = tmp_path / f'best_{rank}.txt'
+        replay, _ = simulate.simulate('file', 1, schedule=simulate.load_schedule(path), map_seed=simulate.load_map_seed(path), out=io.StringIO())
+        assert replay.scores == [score]
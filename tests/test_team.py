@@ -0,0 +1,27 @@
+import numpy as np
+
+from batch import BatchGame, play_batch
+from mnm2 import Game
+from roi import roi_policy
+from team import Match, killer_policy
+
+
+def test_players_wait_for_their_match_round():
+    match = Match([[roi_policy, killer_policy], [killer_policy, roi_policy]], num_matches=3)
+    rng = np.random.default_rng(0)
+    while not np.all(match.done()):
+        match_round = np.repeat(match.match_round(), match.players_per_match)
+        assert np.all(match.players.round - match_round <= 1)
+        actions = np.zeros(match.players.batch_size, dtype=np.int64)
+        for policy, rows in match.policies:
+            actions[rows] = np.asarray(policy(match.players, rng))[rows]
+        match.step(actions)
+    assert np.all(match.players.round == Game.FINAL_ROUND)
+
+
+def test_team_score_is_the_sum_of_independent_games():
+    match = Match([[roi_policy]*4, [roi_policy, roi_policy, killer_policy, killer_policy]], num_matches=2).play(seed=1)
+    alone = play_batch(BatchGame(1), roi_policy).get_score()[0]
+    assert np.array_equal(match.team_scores()[:, 0], [4*alone, 4*alone])
+    assert np.array_equal(match.team_scores(), match.player_scores().sum(axis=2))
+    assert np.all(match.winners() == 0)